@@ -0,0 +1,184 @@
+"""
+Times the main stages of Nexus on synthetic zones generated in a temp directory.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --files 20000 --registry-size 20000 --output results.json
+    python -m benchmarks.run_benchmarks --compare results.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic_zone import ZoneParameters, generate_zone
+from helpers.config_loader import ConfigLoader, load_config
+from helpers.registry_migration import migrate_ordered_files
+from models.app_config import RootConfig
+from models.models import RegistryConfig
+from services.json_config_persister import JsonConfigPersister
+from services.notification_service import NotificationService
+from services.sqlite_database import SqliteDatabase
+from services.state_store import JsonStateStore
+from zone_pipeline import ZonePipeline
+
+
+class StubNotificationService(NotificationService):
+    """ Counts the notifications instead of showing them. """
+
+    def __init__(self):
+        self.sent_count = 0
+
+    def send_notification(self, message: str):
+        self.sent_count += 1
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Nexus on synthetic zones.")
+    parser.add_argument("--files", type=int, default=5000, help="Files in the source of each zone.")
+    parser.add_argument("--folders", type=int, default=20, help="'process_contents' folders in each source.")
+    parser.add_argument("--depth", type=int, default=3, help="Nesting depth of those folders.")
+    parser.add_argument("--rules", type=int, default=30, help="Rules per zone (extension, regex and glob).")
+    parser.add_argument("--registry-size", type=int, default=5000, help="Registered items per zone.")
+    parser.add_argument("--zones", type=int, default=1, help="Number of zones.")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="sqlite", help="Registry backend.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark, on fresh trees.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare the medians against.")
+    return parser.parse_args()
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(timings: Dict[str, List[float]], name: str, function: Callable[[], object]) -> object:
+    start_time = time.perf_counter()
+    result = function()
+    timings.setdefault(name, []).append(time.perf_counter() - start_time)
+    return result
+
+
+def run_once(arguments: argparse.Namespace, timings: Dict[str, List[float]]) -> None:
+    """ Generate fresh zones and time every stage once. Only the stages are timed, not the generation. """
+    parameters = ZoneParameters(files_count=arguments.files, folders_count=arguments.folders,
+                                folder_depth=arguments.depth, rules_count=arguments.rules,
+                                registry_size=arguments.registry_size, seed=arguments.seed)
+
+    with tempfile.TemporaryDirectory(prefix="nexus-benchmark-") as temp_directory:
+        base_path = Path(temp_directory)
+
+        # 1. Settings file with the registries inline, as the 'json' backend keeps them
+        zones = [generate_zone(f"Zone{zone_index}", base_path, parameters) for zone_index in range(arguments.zones)]
+        settings_path = base_path / "data" / "settings.json"
+        settings_path.parent.mkdir()
+        settings_path.write_text(
+            RootConfig(zones=zones, registry=RegistryConfig(backend=arguments.backend))
+            .model_dump_json(indent=4, by_alias=True), encoding='utf-8')
+
+        # 2. Configuration load and save
+        root_config: RootConfig = timed(timings, "load_config", lambda: load_config(str(settings_path)))
+
+        # Same file through the config cache: first launch, then a launch with the file unchanged
+        cache_path = settings_path.with_name("state") / "config.cache"
+        timed(timings, "ConfigLoader.load", lambda: ConfigLoader(str(settings_path), cache_path).load())
+        timed(timings, "ConfigLoader.load (cached)", lambda: ConfigLoader(str(settings_path), cache_path).load())
+        persister = JsonConfigPersister(str(settings_path), root_config)
+        timed(timings, "JsonConfigPersister.save", persister.save)
+
+        database = None
+        if arguments.backend == "sqlite":
+            database = SqliteDatabase(settings_path.with_name("registry.db"))
+            migrate_ordered_files(root_config, database, persister)
+
+        state_store = JsonStateStore(settings_path.with_name("state"))
+        destination_paths = [zone_config.paths.destination_path for zone_config in root_config.zones]
+        pipelines = [ZonePipeline(zone_config, persister, database, StubNotificationService(), state_store,
+                                  destination_paths)
+                     for zone_config in root_config.zones]
+
+        # 3. Pipeline stages, in the order of a run
+        for pipeline in pipelines:
+            pipeline.directory_cache.reset()
+            pipeline.directory_creator.execute()
+
+            with persister.deferred():
+                timed(timings, "Auditor.check_files", pipeline.auditor.check_files)
+                # Second audit of an unchanged tree, as in the next scheduled run
+                timed(timings, "Auditor.check_files (unchanged)", pipeline.auditor.check_files)
+                timed(timings, "FileSorter.sort", pipeline.file_sorter.sort)
+
+        if database:
+            database.close()
+
+
+def summarize(timings: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            "min": min(seconds),
+            "median": statistics.median(seconds),
+            "mean": statistics.fmean(seconds),
+            "runs": seconds,
+        }
+        for name, seconds in timings.items()
+    }
+
+
+def print_results(results: Dict[str, Dict[str, float]], baseline: Optional[dict]) -> None:
+    baseline_results = baseline["results"] if baseline else {}
+
+    for name, result in results.items():
+        line = f"{name:<34} median {result['median'] * 1000:10.1f} ms   min {result['min'] * 1000:10.1f} ms"
+
+        baseline_result = baseline_results.get(name)
+        if baseline_result and baseline_result["median"] > 0:
+            ratio = result["median"] / baseline_result["median"]
+            line += f"   {ratio:5.2f}x vs {baseline.get('commit') or 'baseline'}"
+
+        print(line)
+
+
+def main():
+    arguments = parse_arguments()
+
+    baseline = None
+    if arguments.compare:
+        try:
+            baseline = json.loads(Path(arguments.compare).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            print(f"Error loading results to compare: {e}")
+            return
+
+    timings: Dict[str, List[float]] = {}
+    for _ in range(arguments.repeat):
+        run_once(arguments, timings)
+
+    results = summarize(timings)
+    print_results(results, baseline)
+
+    if arguments.output:
+        report = {
+            "commit": get_commit(),
+            "createdAt": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "parameters": {name: value for name, value in vars(arguments).items()
+                           if name not in ("output", "compare")},
+            "results": results,
+        }
+        Path(arguments.output).write_text(json.dumps(report, indent=4), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
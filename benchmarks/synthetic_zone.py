@@ -0,0 +1,143 @@
+import datetime
+import os
+import random
+from pathlib import Path
+from typing import List, NamedTuple
+
+from models.models import GlobalSettings, LifecyclePolicy, OrderedFile, PathConfig, SortingRule
+from models.app_config import ZoneConfig
+
+# Extensions weighted like a typical downloads folder: a few very common ones and a long tail
+EXTENSIONS = [".pdf", ".jpg", ".png", ".zip", ".docx", ".mp4", ".txt", ".xlsx", ".exe", ".mkv",
+              ".csv", ".pptx", ".mp3", ".iso", ".json", ".webp", ".gif", ".7z", ".srt", ".epub"]
+EXTENSION_WEIGHTS = [1 / (rank + 1) for rank in range(len(EXTENSIONS))]
+
+# Name prefixes targeted by the regex and glob rules
+NAME_PREFIXES = ["report", "invoice", "IMG", "Screenshot", "backup", "scan", "statement", "setup"]
+
+
+class ZoneParameters(NamedTuple):
+    files_count: int = 5000
+    # Folders handled by 'process_contents' rules, and how deep their files are nested
+    folders_count: int = 20
+    folder_depth: int = 3
+    rules_count: int = 30
+    registry_size: int = 5000
+    seed: int = 42
+
+
+def generate_rules(parameters: ZoneParameters) -> List[SortingRule]:
+    """ A rule set mixing extension, regex and glob rules, ending with a catch-all. """
+    rules_random = random.Random(parameters.seed)
+    rules = [
+        # Emptied folders are kept: sending them to the trash would leave the temp directory
+        SortingRule(rule_name="Batches", patterns=["batch_*"], match_by="glob",
+                    handlingStrategy="process_contents", destination_folder="Batches"),
+    ]
+
+    for rule_index in range(max(parameters.rules_count - 2, 1)):
+        # 'delete' keeps expired items inside the temp directory ('trash' would fill the user's trash)
+        lifecycle = LifecyclePolicy(days_to_keep=rules_random.choice([7, 30, 90]), action="delete")
+        kind = rule_index % 3
+
+        if kind == 0:
+            patterns = rules_random.sample(EXTENSIONS, 2)
+            rule = SortingRule(rule_name=f"Extension{rule_index}", patterns=patterns, match_by="extension",
+                               destination_folder=f"Extension{rule_index}", lifecycle=lifecycle)
+        elif kind == 1:
+            prefix = rules_random.choice(NAME_PREFIXES)
+            rule = SortingRule(rule_name=f"Regex{rule_index}", patterns=[rf"^{prefix}_\d{{4}}_{rule_index}\b.*"],
+                               match_by="regex", destination_folder=f"Regex{rule_index}", lifecycle=lifecycle)
+        else:
+            prefix = rules_random.choice(NAME_PREFIXES)
+            extension = rules_random.choice(EXTENSIONS)
+            rule = SortingRule(rule_name=f"Glob{rule_index}", patterns=[f"{prefix}*{rule_index}*{extension}"],
+                               match_by="glob", destination_folder=f"Glob{rule_index}", lifecycle=lifecycle)
+
+        rules.append(rule)
+
+    rules.append(SortingRule(rule_name="Other", patterns=[".*"], match_by="regex", destination_folder="Other",
+                             lifecycle=LifecyclePolicy(days_to_keep=30, action="delete")))
+    return rules
+
+
+def generate_file_name(names_random: random.Random, index: int) -> str:
+    extension = names_random.choices(EXTENSIONS, EXTENSION_WEIGHTS)[0]
+
+    # Roughly a third of the names look like the ones the regex and glob rules expect
+    if names_random.random() < 0.33:
+        prefix = names_random.choice(NAME_PREFIXES)
+        return f"{prefix}_{names_random.randint(2000, 2030)}_{names_random.randint(0, 40)}_{index}{extension}"
+
+    return f"file_{index}_{names_random.getrandbits(32):08x}{extension}"
+
+
+def generate_source(source_path: Path, parameters: ZoneParameters) -> None:
+    """ Fill the source path with loose files and 'process_contents' folders of the given depth. """
+    names_random = random.Random(parameters.seed)
+    source_path.mkdir(parents=True, exist_ok=True)
+
+    files_in_folders = parameters.files_count // 5 if parameters.folders_count else 0
+    for index in range(parameters.files_count - files_in_folders):
+        (source_path / generate_file_name(names_random, index)).write_bytes(b"x" * names_random.randint(0, 2048))
+
+    for folder_index in range(parameters.folders_count):
+        folder_path = source_path / f"batch_{folder_index}"
+        for depth in range(parameters.folder_depth):
+            folder_path = folder_path / f"level_{depth}"
+        folder_path.mkdir(parents=True, exist_ok=True)
+
+        # The folder itself and each of its levels, from the deepest one up
+        level_paths = [folder_path, *folder_path.parents][:parameters.folder_depth + 1]
+
+        for index in range(files_in_folders // parameters.folders_count):
+            level_path = level_paths[index % len(level_paths)]
+            (level_path / generate_file_name(names_random, index)).write_bytes(b"x" * names_random.randint(0, 2048))
+
+
+def generate_registry(destination_path: Path, rules: List[SortingRule], parameters: ZoneParameters) -> List[OrderedFile]:
+    """
+    Registered items that exist in the destination, ordered over the last 120 days,
+    so part of them are due for their lifecycle action.
+    """
+    registry_random = random.Random(parameters.seed + 1)
+    today = datetime.date.today()
+    rules_with_lifecycle = [rule for rule in rules if rule.lifecycle]
+
+    registry = []
+    for index in range(parameters.registry_size):
+        rule = registry_random.choice(rules_with_lifecycle)
+        folder_path = destination_path / rule.destination_folder
+        folder_path.mkdir(parents=True, exist_ok=True)
+
+        name = generate_file_name(registry_random, index)
+        (folder_path / name).write_bytes(b"")
+
+        ordered_date = today - datetime.timedelta(days=registry_random.randint(0, 120))
+        registry.append(OrderedFile(
+            name=name,
+            ordered_date=ordered_date,
+            path=os.path.join(folder_path, name),
+            rule_name_applied=rule.rule_name,
+            expiry_date=rule.lifecycle.get_expiry_date(ordered_date),
+        ))
+
+    return registry
+
+
+def generate_zone(zone_name: str, base_path: Path, parameters: ZoneParameters) -> ZoneConfig:
+    """ Create the source and destination trees of a zone under base_path and return its configuration. """
+    source_path = base_path / zone_name / "source"
+    destination_path = base_path / zone_name / "destination"
+
+    rules = generate_rules(parameters)
+    generate_source(source_path, parameters)
+    registry = generate_registry(destination_path, rules, parameters)
+
+    return ZoneConfig(
+        zone_name=zone_name,
+        paths=PathConfig(source_path=source_path, destination_path=destination_path),
+        settings=GlobalSettings(max_size_in_mb=100),
+        rules=rules,
+        ordered_files=registry,
+    )
@@ -1,17 +1,28 @@
 import datetime
-import fnmatch
 import os
 import pathlib
-import re
-import shutil
-from typing import List, Optional
+import stat
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from send2trash import send2trash
 
+from helpers.directory_cache import DirectoryCache
+from helpers.duplicate_finder import DuplicateCandidate, DuplicateFinder
+from helpers.file_classifier import FileClassifier
+from helpers.file_mover import FileMover
+from helpers.move_executor import MoveExecutor, MoveStatistics
+from helpers.name_index import DestinationNameIndex
+from helpers.protected_paths import ProtectedPaths
+from helpers.rule_matcher import RuleMatcher
+from helpers.scan_cursor import ScanCursor
+from helpers.shard_pool import ShardPool, walk_files
 from models.models import SortingRule, OrderedFile
+from models.plan import PlannedMove, SortPlan
 from services.ordered_files_repository import OrderedFilesRepository
 from services.path_repository import PathRepository
 from services.settings_repository import SettingsRepository
+from services.metrics_recorder import MetricsRecorder
 from services.notification_service import NotificationService
 
 
@@ -19,7 +30,14 @@ class FileSorter:
     def __init__(self, path_repository: PathRepository,
                  settings_repository: SettingsRepository,
                  ordered_files_repository: OrderedFilesRepository,
-                 notificator_service: NotificationService):
+                 notificator_service: NotificationService,
+                 rule_matcher: RuleMatcher,
+                 protected_paths: ProtectedPaths,
+                 file_mover: FileMover,
+                 directory_cache: DirectoryCache,
+                 duplicate_finder: DuplicateFinder,
+                 scan_cursor: ScanCursor,
+                 metrics_recorder: MetricsRecorder):
 
         self.__path_repository = path_repository
         self.__settings_repository = settings_repository
@@ -32,10 +50,20 @@ class FileSorter:
         self.__destination_path = path_repository.get_destination_path()
 
         # Files config
-        self.__size_limit = settings.max_size_in_mb
+        self.__max_concurrent_moves = settings.max_concurrent_moves
 
         # Rules config
-        self.__sorting_rules: List[SortingRule] = self.__settings_repository.get_sorting_rules()
+        self.__rule_matcher = rule_matcher
+        self.__file_classifier = FileClassifier(rule_matcher, self.__destination_path, settings.max_size_in_mb,
+                                                settings.settle_seconds)
+
+        # Large 'process_contents' folders are sorted on a pool of processes while a run classifies items
+        self.__process_contents_workers = settings.process_contents_workers
+        self.__shard_pool: Optional[ShardPool] = None
+        self.__sharded_moved_count = 0
+
+        # Destinations of every zone, never sorted away
+        self.__protected_paths = protected_paths
 
         # Track list
         self.__newly_tracked_items: List[OrderedFile] = []
@@ -43,125 +71,436 @@ class FileSorter:
         # For files/folders moved but not tracked, for notification purposes
         self.__untracked_items_counter = 0
 
+        # Moves are handed to this executor while the main thread keeps classifying items
+        self.__file_mover = file_mover
+        self.__directory_cache = directory_cache
+        self.__move_executor: Optional[MoveExecutor] = None
+
+        # Names taken in each destination folder: an item never takes the place of another one
+        self.__name_index = DestinationNameIndex()
+        self.move_statistics = MoveStatistics()
+
+        # Files of rules with deduplication wait here until their content is compared with the destination
+        self.__duplicate_finder = duplicate_finder
+        self.__duplicate_candidates: List[Tuple[PlannedMove, int]] = []
+        self.__duplicate_counts: Counter = Counter()
+
+        # Items left in place by earlier runs are skipped while they do not change. With rules matching by
+        # age, an unchanged file may match another rule later on: only the files too large are remembered then
+        self.__scan_cursor = scan_cursor
+        self.__is_match_cacheable = not rule_matcher.has_age_conditions
+        self.__unchanged_items_count = 0
+
+        # Counted per run and recorded once at the end, so the per-file cost stays an integer increment
+        self.__metrics_recorder = metrics_recorder
+        self.__scanned_files_count = 0
+        self.__rule_match_counts: Counter = Counter()
+        self.__unsettled_files_count = 0
+
+        # Top-level items holding files still being written, with the seconds until they can be sorted again
+        self.unsettled_items: Dict[pathlib.Path, float] = {}
+        self.__current_item: Optional[pathlib.Path] = None
+
+        # While planning, classified items are collected here instead of being moved
+        self.__planned_moves: Optional[List[PlannedMove]] = None
+        self.__planned_folders_to_trash: List[pathlib.Path] = []
 
     def sort(self):
+        """ Sort every item found in the source path, streamed from a single scandir. """
+        self.__sort(self.__scan_source_items(), is_full_scan=True)
+
+    def sort_items(self, items: Iterable[Union[pathlib.Path, os.DirEntry]]):
+        """
+        Sort only the given items of the source path (used by watch mode for the items that changed).
+
+        :param items: Top-level items of the source path, scandir entries reuse their stat data.
+        """
+        self.__sort(items, is_full_scan=False)
+
+    def __sort(self, items: Iterable[Union[pathlib.Path, os.DirEntry]], is_full_scan: bool):
         # 1. Clean up the newly tracked items list
+        self.__start_run()
+
+        # 2. Iterate through the items, moves run in the background
+        with MoveExecutor(self.__file_mover, self.__max_concurrent_moves, self.__directory_cache,
+                          self.__metrics_recorder) as move_executor:
+            self.__move_executor = move_executor
+            self.__classify_items(items)
+
+        # 3. Save newly tracked items
+        self.__finish_run(move_executor)
+        self.__scan_cursor.save(is_full_scan)
+
+    def plan(self) -> SortPlan:
+        """
+        Decide where every item of the source path would go, without moving anything.
+
+        :return: The moves and folder deletions, to be applied by execute_plan().
+        """
+        self.__protected_paths.refresh()
+        self.__reset_counters()
+        self.__name_index.reset()
+        self.__planned_moves = []
+        self.__planned_folders_to_trash = []
+
+        try:
+            self.__classify_items(self.__scan_source_items())
+            return SortPlan(moves=tuple(self.__planned_moves),
+                            folders_to_trash=tuple(self.__planned_folders_to_trash))
+        finally:
+            self.__planned_moves = None
+            self.__planned_folders_to_trash = []
+            # A plan writes no state: the hashes and the items left in place are found again when it is applied
+            self.__duplicate_candidates = []
+
+    def execute_plan(self, sort_plan: SortPlan):
+        """
+        Apply a sort plan in bulk: moves are grouped by destination folder, so each folder is created once.
+
+        :param sort_plan: A plan from plan(), possibly computed by an earlier process.
+        """
+        self.__start_run()
+
+        # Destination folder -> moves into it
+        moves_by_folder: Dict[pathlib.Path, List[PlannedMove]] = defaultdict(list)
+        for planned_move in sort_plan.moves:
+            if planned_move.duplicate_of is None:
+                moves_by_folder[planned_move.destination_path.parent].append(planned_move)
+
+        with MoveExecutor(self.__file_mover, self.__max_concurrent_moves, self.__directory_cache,
+                          self.__metrics_recorder) as move_executor:
+            self.__move_executor = move_executor
+
+            for destination_folder_path, planned_moves in moves_by_folder.items():
+                try:
+                    self.__directory_cache.ensure(destination_folder_path)
+                except OSError as e:
+                    print(f"Error creating folder {destination_folder_path}: {e}")
+                    continue
+
+                # The folder may have changed since the plan was computed
+                for planned_move in planned_moves:
+                    self.__submit_move(self.__with_free_name(planned_move, os.path.isdir(planned_move.source_path)))
+
+            # Duplicates are handled once the copies they duplicate are in place
+            move_executor.wait()
+            for planned_move in sort_plan.moves:
+                if planned_move.duplicate_of is not None:
+                    self.__handle_duplicate(planned_move)
+
+            # Folders are only deleted once every move out of them has finished
+            move_executor.wait()
+            for folder_path in sort_plan.folders_to_trash:
+                self.__trash_folder(folder_path)
+
+        self.__finish_run(move_executor)
+
+    def __start_run(self):
         self.__newly_tracked_items = []
         self.__untracked_items_counter = 0
+        self.__reset_counters()
+        self.__name_index.reset()
 
-        source_path = self.__path_repository.get_source_path()
-        destination_path = self.__path_repository.get_destination_path()
-
-        abs_destination_path = destination_path.resolve()
+        # Resolved once per run instead of once per item
+        self.__protected_paths.refresh()
 
-        # 2. Iterate through items in the source path
-        for item in source_path.iterdir():
-            if self.__is_protected_path(item, abs_destination_path):
-                continue
+        # Cross-device moves interrupted by a previous run are finished or rolled back first
+        recovered_moves_count = self.__file_mover.recover()
+        if recovered_moves_count:
+            print(f"Recovered {recovered_moves_count} interrupted moves")
 
-            if item.is_file():
-                self.__process_file(item)
-            elif item.is_dir():
-                self.__process_folder(item)
+    def __finish_run(self, move_executor: MoveExecutor):
+        self.__move_executor = None
+        # Files moved by the shard workers were renamed outside of the executor
+        self.move_statistics = move_executor.statistics._replace(
+            moved_count=move_executor.statistics.moved_count + self.__sharded_moved_count)
+        self.__record_metrics()
+        self.__duplicate_finder.save()
 
-        # 3. Save newly tracked items
         if self.__newly_tracked_items:
-            self.__ordered_files_repository.save_ordered_files(self.__newly_tracked_items)
+            with self.__metrics_recorder.timer("operation_seconds", operation="registry_save"):
+                self.__ordered_files_repository.save_ordered_files(self.__newly_tracked_items)
             self.__notification_service.send_notification(f"{len(self.__newly_tracked_items)} files were sorted")
 
         if self.__untracked_items_counter > 0:
             self.__notification_service.send_notification(f"{self.__untracked_items_counter} items were moved but not tracked")
 
-    def __is_protected_path(self, item_path: pathlib.Path, protected_path: pathlib.Path) -> bool:
-        """
-        Check if the given item path is the same as or a subpath of the protected path.
+        # One counted message per action, so the batched notifications of several runs add up
+        action_descriptions = {"skip": "left in the source", "hardlink": "linked to their copy", "trash": "trashed"}
+        for action, duplicates_count in self.__duplicate_counts.items():
+            self.__notification_service.send_notification(f"{duplicates_count} duplicates {action_descriptions[action]}")
+
+    def __reset_counters(self):
+        self.__scanned_files_count = 0
+        self.__rule_match_counts = Counter()
+        self.__duplicate_counts = Counter()
+        self.__sharded_moved_count = 0
+        self.__unsettled_files_count = 0
+        self.__unchanged_items_count = 0
+        self.unsettled_items = {}
+
+    def __record_metrics(self):
+        self.__metrics_recorder.increment("files_scanned", self.__scanned_files_count)
+        self.__metrics_recorder.increment("files_unsettled", self.__unsettled_files_count)
+        self.__metrics_recorder.increment("items_unchanged", self.__unchanged_items_count)
+        for rule_name, match_count in self.__rule_match_counts.items():
+            self.__metrics_recorder.increment("items_matched", match_count, rule=rule_name)
+
+        for action, duplicates_count in self.__duplicate_counts.items():
+            self.__metrics_recorder.increment("duplicates_found", duplicates_count, action=action)
+
+        self.__metrics_recorder.increment("items_moved", self.move_statistics.moved_count)
+        self.__metrics_recorder.increment("moves_failed", self.move_statistics.failed_count)
+
+    def __classify_items(self, items: Iterable[Union[pathlib.Path, os.DirEntry]]):
+        if self.__process_contents_workers > 1:
+            self.__shard_pool = ShardPool(self.__file_classifier, self.__process_contents_workers)
 
-        :param item_path: The path of the item to check.
-        :param protected_path: The path that should be protected (e.g., destination folder).
-        :return: True if the item path is the same as or a subpath of the protected path, False otherwise.
-        """
         try:
-            # Resolve both paths to their absolute forms
-            abs_item_path = item_path.resolve()
-            abs_protected_path = protected_path.resolve()
+            self.__classify_each_item(items)
+        finally:
+            if self.__shard_pool is not None:
+                self.__shard_pool.close()
+                self.__shard_pool = None
 
-            # Check if the item path is exactly the same as the protected path
-            if abs_item_path == abs_protected_path:
-                return True
+        self.__resolve_duplicates()
 
-            # Check if the item path is a subpath of the protected path
-            if abs_protected_path.is_relative_to(abs_item_path):
-                return True
+    def __classify_each_item(self, items: Iterable[Union[pathlib.Path, os.DirEntry]]):
+        for item in items:
+            item_path = pathlib.Path(item)
 
-            return False
+            # One stat per item, reused by every check below (a symlink costs one more to follow it)
+            try:
+                item_stat = item.stat(follow_symlinks=False) if isinstance(item, os.DirEntry) \
+                    else os.lstat(item_path)
+                if stat.S_ISLNK(item_stat.st_mode):
+                    item_stat = os.stat(item_path)
+            except OSError:
+                # The item is gone since it was listed, or is a broken link
+                continue
 
-        except Exception as e:
-            print(f"Error checking protected path for {item_path}: {e}")
-            return False
+            if self.__protected_paths.is_protected(item_path, item_stat):
+                continue
+
+            if self.__scan_cursor.is_unchanged(item_path, item_stat):
+                self.__unchanged_items_count += 1
+                continue
 
-    def __process_file(self, file_path: pathlib.Path):
+            self.__current_item = item_path
+            if stat.S_ISREG(item_stat.st_mode):
+                self.__process_file(item_path, item_stat)
+            elif stat.S_ISDIR(item_stat.st_mode):
+                self.__process_folder(item_path, item_stat)
+
+    def __scan_source_items(self) -> Iterator[os.DirEntry]:
+        """ Top-level entries of the source path, handed to the classifier as they are read. """
+        with os.scandir(self.__path_repository.get_source_path()) as entries:
+            yield from entries
+
+    def __process_file(self, file_path: pathlib.Path, file_stat: os.stat_result):
         """
         Process a single file: determine its destination folder, move it, and track it.
-        1. Check the file size.
-        2. Find the rule that matches the file.
-        3. Move the file to the destination folder.
-        4. Track the file.
+        1. Leave the file in place while it is still being written.
+        2. Check the file size.
+        3. Find the rule that matches the file.
+        4. Move the file to the destination folder.
+        5. Track the file.
 
         :param file_path: Path of the file to process.
+        :param file_stat: Stat of the file, taken while listing its folder.
         :return: None
 
         """
 
-        # 1. Check if file exists
-        if not file_path.exists():
+        self.__scanned_files_count += 1
+
+        # 1. Files modified within the settle interval are sorted by a later run
+        settle_delay = self.__file_classifier.get_settle_delay(file_stat)
+        if settle_delay > 0:
+            self.__defer_unsettled(settle_delay)
             return
 
-        # 2. Check file size
-        if file_path.stat().st_size >= (self.__size_limit * 1024 * 1024):
+        # 2. - 3. Check the size, find the rule (sizes and ages are checked on the same stat) and its destination folder
+        item_rule, planned_move = self.__file_classifier.classify(file_path, file_stat)
+
+        if item_rule:
+            self.__rule_match_counts[item_rule.rule_name] += 1
+
+        if planned_move is None:
+            # Left in place: too large, or ignored or unmatched (unless that depends on its age)
+            if self.__is_match_cacheable or self.__file_classifier.is_too_large(file_stat):
+                self.__scan_cursor.record(file_path, file_stat)
+            return
+
+        # 4. Move the file (or plan its move). Files of rules with deduplication are first
+        # compared with the destination
+        if item_rule.deduplication and item_rule.deduplication.enabled:
+            self.__duplicate_candidates.append((planned_move, file_stat.st_size))
             return
 
-        # 3. Find destination folder and rule
-        item_rule = self.__find_matching_rule(file_path.name)
+        self.__add_move(planned_move)
 
-        # 3.1 Check if handling strategy is ignore
-        if item_rule and item_rule.handlingStrategy == 'ignore':
+    def __defer_unsettled(self, settle_delay: float, files_count: int = 1):
+        """ Remember the top-level item holding files still being written, to be sorted again once they settle. """
+        self.__unsettled_files_count += files_count
+        self.unsettled_items[self.__current_item] = min(
+            settle_delay, self.unsettled_items.get(self.__current_item, settle_delay))
+
+    def __resolve_duplicates(self):
+        """ Compare the pending candidates with their destination folders: move the new ones, handle the duplicates. """
+        if not self.__duplicate_candidates:
             return
 
+        candidates = self.__duplicate_candidates
+        self.__duplicate_candidates = []
+
+        # Moves in flight may land in the folders being compared
+        if self.__move_executor is not None:
+            self.__move_executor.wait()
+
+        with self.__metrics_recorder.timer("operation_seconds", operation="duplicate_check"):
+            duplicates = self.__duplicate_finder.find_duplicates(
+                [DuplicateCandidate(planned_move.source_path, size, planned_move.destination_path)
+                 for planned_move, size in candidates])
 
-        destination_folder_name = item_rule.destination_folder
+        # Where each new file goes, by source path (its name may have been taken)
+        moved_destinations: Dict[pathlib.Path, pathlib.Path] = {}
+
+        duplicate_moves = []
+        for planned_move, _ in candidates:
+            duplicate_of = duplicates.get(planned_move.source_path)
+            if duplicate_of is None:
+                moved_destinations[planned_move.source_path] = self.__add_move(planned_move).destination_path
+                continue
+
+            # A duplicate of an earlier candidate points to where that candidate goes
+            duplicate_of = moved_destinations.get(duplicate_of, duplicate_of)
+
+            deduplication = self.__rule_matcher.get_rule_by_name(planned_move.rule_name).deduplication
+            duplicate_moves.append(planned_move.model_copy(update={"duplicate_of": duplicate_of,
+                                                                    "duplicate_action": deduplication.action}))
+
+        if self.__planned_moves is not None:
+            self.__planned_moves.extend(duplicate_moves)
+            return
 
-        # 4. Create destination path and move file
-        destination_folder_path = self.__destination_path / destination_folder_name
-        destination_folder_path.mkdir(parents=True, exist_ok=True)
-        final_file_path = destination_folder_path / file_path.name
+        # A duplicate of another candidate is only handled once that candidate is in place
+        self.__move_executor.wait()
+        for planned_move in duplicate_moves:
+            self.__handle_duplicate(planned_move)
+
+    def __handle_duplicate(self, planned_move: PlannedMove):
+        source_path = planned_move.source_path
+        action = planned_move.duplicate_action
+
+        # A plan may be executed later, or the copy replaced since it was hashed: the content is compared
+        # again before the file is removed, else the file is moved as usual
+        if not self.__duplicate_finder.is_same_content(source_path, planned_move.duplicate_of):
+            self.__add_move(planned_move.model_copy(update={"duplicate_of": None, "duplicate_action": None}))
+            return
 
         try:
-            shutil.move(str(file_path), str(final_file_path))
+            if action == 'trash':
+                send2trash(str(source_path))
+            elif action == 'hardlink':
+                if not self.__link_duplicate(planned_move):
+                    return
+        except OSError as e:
+            print(f"Error handling duplicate {source_path}: {e}")
+            return
 
-            # 5. Track the moved file if lifecycle is enabled
-            has_active_lifecycle = item_rule and item_rule.lifecycle and item_rule.lifecycle.enabled
+        self.__duplicate_counts[action] += 1
 
-            if not has_active_lifecycle:
-                self.__untracked_items_counter += 1
-                return
+    def __link_duplicate(self, planned_move: PlannedMove) -> bool:
+        """
+        Replace the move by a hard link to the existing copy, then remove the source.
 
-            items_to_track = OrderedFile(
-                name=file_path.name,
-                ordered_date=datetime.datetime.now().date(),
-                path=str(final_file_path),
-                rule_name_applied=item_rule.rule_name,
-            )
+        :return: False when the filesystem has no hard links and the file was moved instead.
+        """
+        if planned_move.destination_path != planned_move.duplicate_of:
+            # The link takes a free name, like a move would
+            planned_move = self.__with_free_name(planned_move)
+            destination_path = planned_move.destination_path
+            try:
+                self.__directory_cache.ensure(destination_path.parent)
+                os.link(planned_move.duplicate_of, destination_path)
+            except OSError as e:
+                self.__name_index.release(destination_path)
+                print(f"Error linking {destination_path} to {planned_move.duplicate_of}, moving it instead: {e}")
+                self.__add_move(planned_move.model_copy(update={"duplicate_of": None, "duplicate_action": None}))
+                return False
+
+        os.remove(planned_move.source_path)
+        self.__on_moved(planned_move)
+        return True
+
+    def __add_move(self, planned_move: PlannedMove, is_folder: bool = False) -> PlannedMove:
+        """
+        :param is_folder: The item is a folder, its name is numbered as a whole if taken.
+        :return: The move actually made (or planned), under a free name.
+        """
+        planned_move = self.__with_free_name(planned_move, is_folder)
+
+        if self.__planned_moves is not None:
+            self.__planned_moves.append(planned_move)
+            return planned_move
+
+        # Known folders are not created again for every item
+        self.__directory_cache.ensure(planned_move.destination_path.parent)
+        self.__submit_move(planned_move)
+        return planned_move
+
+    def __with_free_name(self, planned_move: PlannedMove, is_folder: bool = False) -> PlannedMove:
+        """ The move under the first free name of its destination folder ('report (2).pdf' if 'report.pdf' is taken). """
+        destination_path = self.__name_index.reserve(planned_move.destination_path, keep_extension=not is_folder)
+        if destination_path == planned_move.destination_path:
+            return planned_move
+
+        ordered_file = planned_move.ordered_file
+        if ordered_file is not None:
+            ordered_file = ordered_file.model_copy(update={"name": destination_path.name, "path": str(destination_path)})
+        return planned_move.model_copy(update={"destination_path": destination_path, "ordered_file": ordered_file})
+
+    def __submit_move(self, planned_move: PlannedMove):
+        self.__move_executor.submit(
+            planned_move.source_path, planned_move.destination_path,
+            on_success=lambda: self.__on_moved(planned_move),
+            on_error=lambda e: self.__on_move_failed(planned_move, e)
+        )
+
+    def __on_move_failed(self, planned_move: PlannedMove, error: Exception):
+        self.__name_index.release(planned_move.destination_path)
+        print(f"Error moving {planned_move.source_path} to {planned_move.destination_path}: {error}")
+
+    def __on_moved(self, planned_move: PlannedMove):
+        self.__duplicate_finder.record_moved(planned_move.source_path, planned_move.destination_path)
+
+        # 5. Track the moved item if lifecycle is enabled
+        items_to_track = planned_move.ordered_file
+
+        if items_to_track is None:
+            self.__untracked_items_counter += 1
+            return
 
-            self.__newly_tracked_items.append(items_to_track)
+        # A plan executed on a later day: the retention period starts when the item is actually moved
+        today = datetime.datetime.now().date()
+        if items_to_track.ordered_date != today:
+            days_late = today - items_to_track.ordered_date
+            items_to_track = items_to_track.model_copy(update={
+                "ordered_date": today,
+                "expiry_date": items_to_track.expiry_date + days_late if items_to_track.expiry_date else None,
+            })
 
-        except Exception as e:
-            print(f"Error moving file {file_path} to {final_file_path}: {e}")
+        self.__newly_tracked_items.append(items_to_track)
 
-    def __process_folder(self, folder_path: pathlib.Path):
+    def __process_folder(self, folder_path: pathlib.Path, folder_stat: os.stat_result):
         rule = self.__find_matching_rule(folder_path.name)
         action = rule.handlingStrategy
+        self.__rule_match_counts[rule.rule_name] += 1
 
         if action == 'ignore':
+            # Folders are matched by name alone, the folder is skipped while it stays
+            self.__scan_cursor.record(folder_path, folder_stat)
             return
 
         elif action == 'process_contents':
@@ -170,17 +509,24 @@ class FileSorter:
             if not rule or not rule.destination_folder:
                 return
 
-            # 2. Process each file in the folder
-            for sub_item in folder_path.rglob('*'):
-                if sub_item.is_file():
-                    self.__process_file(sub_item)
+            # 2. Process each file in the folder (on the shard pool for a large folder)
+            if not self.__process_folder_shards(folder_path):
+                for sub_item, sub_item_stat in walk_files(folder_path):
+                    if self.__scan_cursor.is_unchanged(sub_item, sub_item_stat):
+                        self.__unchanged_items_count += 1
+                        continue
+                    self.__process_file(sub_item, sub_item_stat)
 
-            # 3. Delete the empty folder if specified
-            if rule and rule.delete_empty_after_processing:
-                try:
-                    send2trash(str(folder_path))
-                except Exception as e:
-                    print(f"Error deleting non-empty folder {folder_path}: {e}")
+            # 3. Delete the empty folder if specified (its duplicates are handled first)
+            if rule.delete_empty_after_processing:
+                self.__resolve_duplicates()
+
+                if self.__planned_moves is not None:
+                    self.__planned_folders_to_trash.append(folder_path)
+                else:
+                    # The folder can only be deleted once every move out of it has finished
+                    self.__move_executor.wait()
+                    self.__trash_folder(folder_path)
 
         elif action == 'move':
             destination_base = self.__path_repository.get_destination_path()
@@ -188,41 +534,73 @@ class FileSorter:
 
             final_destination_path = destination_base / destination_folder / folder_path.name
 
-            # Ensure the destination folder exists
-            (destination_base / destination_folder).mkdir(exist_ok=True, parents=True)
+            self.__add_move(PlannedMove(
+                source_path=folder_path,
+                destination_path=final_destination_path,
+                rule_name=rule.rule_name,
+                ordered_file=FileClassifier.get_ordered_file(rule, final_destination_path),
+            ), is_folder=True)
 
-            try:
-                shutil.move(str(folder_path), str(final_destination_path))
-                if rule and rule.lifecycle and rule.lifecycle.enabled:
-                    items_to_track = OrderedFile(
-                        name=folder_path.name,
-                        ordered_date=datetime.datetime.now().date(),
-                        path=str(final_destination_path),
-                        rule_name_applied=action,
-                    )
-                    self.__newly_tracked_items.append(items_to_track)
+    def __process_folder_shards(self, folder_path: pathlib.Path) -> bool:
+        """
+        Sort the files of the folder on the shard pool: workers classify and move them, the parent
+        registers the moved files and handles the moves the workers left behind.
 
-                else:
-                    self.__untracked_items_counter += 1
-            except Exception as e:
-                print(f"Error moving folder {folder_path} to {final_destination_path}: {e}")
+        :return: False when the folder is not worth sharding, and must be walked sequentially.
+        """
+        if self.__shard_pool is None:
+            return False
+
+        shards = self.__shard_pool.split(folder_path)
+        if len(shards) < 2:
+            return False
+
+        # Moves in flight may land where the workers move their files
+        if self.__move_executor is not None:
+            self.__move_executor.wait()
+
+        pending_moves: List[PlannedMove] = []
+
+        with self.__metrics_recorder.timer("operation_seconds", operation="sharded_sort"):
+            for shard_result in self.__shard_pool.sort(shards, move_files=self.__planned_moves is None):
+                self.__scanned_files_count += shard_result.scanned_count
+                self.__rule_match_counts.update(shard_result.rule_match_counts)
+
+                self.__sharded_moved_count += len(shard_result.moved)
+                for source_path, rule_name in shard_result.moved:
+                    planned_move = self.__build_move(source_path, rule_name)
+                    self.__name_index.add(planned_move.destination_path)
+                    self.__on_moved(planned_move)
+
+                pending_moves.extend(self.__build_move(source_path, rule_name)
+                                     for source_path, rule_name in shard_result.pending)
+
+                for source_path, rule_name, size in shard_result.duplicate_candidates:
+                    self.__duplicate_candidates.append((self.__build_move(source_path, rule_name), size))
+
+                if shard_result.unsettled_count:
+                    self.__defer_unsettled(shard_result.settle_delay, shard_result.unsettled_count)
+
+        # Moves the workers left behind run once every worker is done (no name can be taken behind
+        # the name index anymore), in shard order, as the sequential walk would
+        for planned_move in pending_moves:
+            self.__add_move(planned_move)
+
+        return True
+
+    def __build_move(self, source_path: str, rule_name: str) -> PlannedMove:
+        return self.__file_classifier.build_move(pathlib.Path(source_path),
+                                                 self.__rule_matcher.get_rule_by_name(rule_name))
+
+    @staticmethod
+    def __trash_folder(folder_path: pathlib.Path):
+        try:
+            send2trash(str(folder_path))
+        except Exception as e:
+            print(f"Error deleting non-empty folder {folder_path}: {e}")
 
     def __find_matching_rule(self, item_name: str) -> Optional[SortingRule]:
         """"
         Find the first sorting rule that matches the given item name.
         """
-
-        for rule in self.__sorting_rules:
-            if rule.match_by == "extension":
-                _, extension = os.path.splitext(item_name)
-                if extension.lower() in [p.lower() for p in rule.patterns]:
-                    return rule
-            elif rule.match_by == "regex":
-                for pattern in rule.patterns:
-                    if re.match(pattern, item_name):
-                        return rule
-            elif rule.match_by == "glob":
-                for pattern in rule.patterns:
-                    if fnmatch.fnmatch(item_name, pattern):
-                        return rule
-        return None
\ No newline at end of file
+        return self.__rule_matcher.match(item_name)
@@ -1,6 +1,37 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import typing
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
 
+from pydantic import BaseModel, TypeAdapter
+
+from helpers.rule_matcher import RuleMatcher
 from models.app_config import RootConfig
+from models.base import CamelCaseModel
+from models.models import OrderedFile
+
+# Bumped whenever the layout of the cached entry changes, including the state RuleMatcher pickles
+# (its attributes or the compiled matchers it keeps): a stale matcher would be loaded as is
+CONFIG_CACHE_VERSION = 2
+
+# Keys a zone's registry may be written under (camelCase alias or field name)
+ORDERED_FILES_KEYS = ("orderedFiles", "ordered_files")
+
+_ordered_files_adapter = TypeAdapter(List[OrderedFile])
+
+
+class _ZoneRegistry(CamelCaseModel):
+    zone_name: str
+    ordered_files: List[OrderedFile] = []
+
+
+class _RegistryDocument(CamelCaseModel):
+    """ Only the registries of settings.json, every other key is skipped while parsing. """
+    zones: List[_ZoneRegistry] = []
 
 
 def load_config(json_path: str) -> RootConfig:
@@ -13,4 +44,213 @@ def load_config(json_path: str) -> RootConfig:
         return RootConfig.model_validate_json(json_data_string)
 
     except Exception as e:
-        raise RuntimeError(f"Failed to load configuration from {json_path}: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to load configuration from {json_path}: {e}")
+
+
+def _get_raw_registry(zone: dict) -> List[dict]:
+    for key in ORDERED_FILES_KEYS:
+        if zone.get(key):
+            return zone[key]
+    return []
+
+
+def _get_models_fingerprint() -> str:
+    """ Field names and types of every configuration model, so a cache written by another version is ignored. """
+    fields = []
+    visited = set()
+
+    def visit(annotation: Any) -> None:
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            if annotation in visited:
+                return
+            visited.add(annotation)
+            for field_name, field in annotation.model_fields.items():
+                fields.append(f"{annotation.__qualname__}.{field_name}:{field.annotation!r}")
+                visit(field.annotation)
+        for argument in typing.get_args(annotation):
+            visit(argument)
+
+    visit(RootConfig)
+    return hashlib.sha256("\n".join(fields).encode('utf-8')).hexdigest()
+
+
+class ConfigLoader:
+    """
+    Loads settings.json zone by zone, behind a cache of the validated configuration.
+
+    The configuration (without the registries) and the compiled rules of every zone are pickled
+    next to the state files, keyed on the file's mtime, size and content hash. While the file does
+    not change, a launch skips pydantic validation and rule compilation altogether.
+
+    The 'orderedFiles' registries (json backend) are validated only for the selected zones. The
+    registries of the other zones stay as raw JSON and are written back untouched by the persister.
+    """
+
+    def __init__(self, json_path: str, cache_path: Optional[Path] = None):
+        self.__json_path = Path(json_path)
+        self.__cache_path = cache_path
+
+        self.__root_config: Optional[RootConfig] = None
+        self.__rule_matchers: Dict[str, RuleMatcher] = {}
+
+        # Zone name -> raw registry of the zones whose registry was not loaded
+        self.__unloaded_ordered_files: Dict[str, List[dict]] = {}
+
+    def load(self, zone_names: Optional[Iterable[str]] = None) -> RootConfig:
+        """
+        :param zone_names: Zones whose registry is needed, every zone by default.
+        """
+        try:
+            json_bytes = self.__json_path.read_bytes()
+            file_stat = os.stat(self.__json_path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load configuration from {self.__json_path}: {e}")
+
+        cache_key = self.__get_cache_key(json_bytes, file_stat)
+        cache_entry = self.__load_cache(cache_key)
+
+        root_config: Optional[RootConfig] = None
+        zones_with_registry: Set[str] = set()
+        if cache_entry:
+            root_config = cache_entry["root_config"]
+            zones_with_registry = cache_entry["zones_with_registry"]
+            self.__rule_matchers = cache_entry["rule_matchers"]
+
+        self.__unloaded_ordered_files = {}
+
+        try:
+            if zone_names is None:
+                # 1. Every zone: configuration and registries are validated in a single pass over the JSON
+                if root_config is None:
+                    root_config = RootConfig.model_validate_json(json_bytes)
+                elif zones_with_registry:
+                    registry_document = _RegistryDocument.model_validate_json(json_bytes)
+                    for zone_config, zone_registry in zip(root_config.zones, registry_document.zones):
+                        zone_config.ordered_files = zone_registry.ordered_files
+            else:
+                # 2. Some zones: only their registries are validated, the others are kept as raw JSON
+                selected_zone_names = set(zone_names)
+                document = json.loads(json_bytes) if root_config is None or zones_with_registry else None
+
+                if root_config is None:
+                    root_config = self.__validate_without_registries(document)
+
+                raw_zones = document.get("zones", []) if document else []
+                for zone_config, raw_zone in zip(root_config.zones, raw_zones):
+                    raw_registry = _get_raw_registry(raw_zone)
+                    if not raw_registry:
+                        continue
+
+                    if zone_config.zone_name in selected_zone_names:
+                        zone_config.ordered_files = _ordered_files_adapter.validate_python(raw_registry)
+                    else:
+                        self.__unloaded_ordered_files[zone_config.zone_name] = raw_registry
+
+        except Exception as e:
+            raise RuntimeError(f"Failed to load configuration from {self.__json_path}: {e}")
+
+        self.__root_config = root_config
+
+        if not cache_entry:
+            self.__rule_matchers = {zone_config.zone_name: RuleMatcher(zone_config.rules)
+                                    for zone_config in root_config.zones}
+            self.__save_cache(cache_key)
+
+        return root_config
+
+    def get_rule_matcher(self, zone_name: str) -> Optional[RuleMatcher]:
+        """ The compiled rules of a zone, built by load() or restored from the cache. """
+        return self.__rule_matchers.get(zone_name)
+
+    def restore_unloaded_registries(self, document: dict) -> None:
+        """ Put the raw registries of the zones that were not loaded back into a dumped configuration. """
+        for zone in document.get("zones", []):
+            raw_registry = self.__unloaded_ordered_files.get(zone.get("zoneName", zone.get("zone_name")))
+            if raw_registry is not None:
+                zone[ORDERED_FILES_KEYS[0]] = raw_registry
+
+    def refresh_cache(self, zones_with_registry: Set[str]) -> None:
+        """
+        Re-key the cache after the configuration was written back (only the registries change),
+        so the next launch is still a cache hit.
+
+        :param zones_with_registry: Zones whose registry is not empty in the written file.
+        """
+        if self.__root_config is None or self.__cache_path is None:
+            return
+
+        try:
+            json_bytes = self.__json_path.read_bytes()
+            file_stat = os.stat(self.__json_path)
+        except OSError:
+            return
+        self.__save_cache(self.__get_cache_key(json_bytes, file_stat), zones_with_registry)
+
+    def __validate_without_registries(self, document: dict) -> RootConfig:
+        registry_free_document = {
+            **document,
+            "zones": [{key: value for key, value in zone.items() if key not in ORDERED_FILES_KEYS}
+                      for zone in document.get("zones", [])],
+        }
+        return RootConfig.model_validate(registry_free_document)
+
+    @staticmethod
+    def __get_cache_key(json_bytes: bytes, file_stat: os.stat_result) -> tuple:
+        return (CONFIG_CACHE_VERSION, _get_models_fingerprint(), file_stat.st_mtime_ns, file_stat.st_size,
+                hashlib.sha256(json_bytes).hexdigest())
+
+    def __load_cache(self, cache_key: tuple) -> Optional[dict]:
+        if self.__cache_path is None:
+            return None
+
+        try:
+            with open(self.__cache_path, 'rb') as cache_file:
+                cache_entry = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # A corrupted or outdated cache only costs a full validation
+            print(f"Error loading configuration cache: {e}")
+            return None
+
+        if not isinstance(cache_entry, dict) or cache_entry.get("key") != cache_key:
+            return None
+        return cache_entry
+
+    def __save_cache(self, cache_key: tuple, zones_with_registry: Optional[Set[str]] = None) -> None:
+        if self.__cache_path is None:
+            return
+
+        if zones_with_registry is None:
+            zones_with_registry = {zone_config.zone_name for zone_config in self.__root_config.zones
+                                   if zone_config.ordered_files}
+            zones_with_registry.update(zone_name for zone_name, raw_registry
+                                       in self.__unloaded_ordered_files.items() if raw_registry)
+
+        # The cached configuration never holds registries, they are read from the file. The copies
+        # share their rules with the compiled matchers, so both are restored as the same objects.
+        registry_free_config = self.__root_config.model_copy(update={
+            "zones": [zone_config.model_copy(update={"ordered_files": []}) for zone_config in self.__root_config.zones]
+        })
+
+        cache_bytes = pickle.dumps({
+            "key": cache_key,
+            "root_config": registry_free_config,
+            "zones_with_registry": zones_with_registry,
+            "rule_matchers": self.__rule_matchers,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+        try:
+            self.__cache_path.parent.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=self.__cache_path.parent, prefix=".config.",
+                                                          suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, 'wb') as cache_file:
+                    cache_file.write(cache_bytes)
+                os.replace(temp_path, self.__cache_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        except OSError as e:
+            print(f"Error saving configuration cache: {e}")
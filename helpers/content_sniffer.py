@@ -0,0 +1,69 @@
+import os
+from collections import OrderedDict
+from typing import Tuple
+
+from models.content_types import FTYP_BRANDS, RIFF_FORMATS, SIGNATURES, ZIP_MARKERS
+
+
+class ContentSniffer:
+    """
+    Detects the type of a file from its magic bytes.
+
+    Only the first HEADER_SIZE bytes are read, with a single read call, and the result is cached on
+    (device, inode, mtime, size): a file seen again unchanged (watch mode, files left in the source)
+    is not opened twice.
+    """
+
+    HEADER_SIZE = 8 * 1024
+
+    def __init__(self, cache_size: int = 4096):
+        self.__cache_size = cache_size
+        self.__cache: "OrderedDict[tuple, Tuple[str, ...]]" = OrderedDict()
+
+    def get_types(self, file_path: str, file_stat: os.stat_result) -> Tuple[str, ...]:
+        """
+        :return: The detected types, the most specific first (e.g. ('docx', 'zip')), empty if unknown.
+        """
+        cache_key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        content_types = self.__cache.get(cache_key)
+        if content_types is not None:
+            self.__cache.move_to_end(cache_key)
+            return content_types
+
+        try:
+            # Unbuffered: a single read system call of at most HEADER_SIZE bytes
+            with open(file_path, 'rb', buffering=0) as file:
+                header = file.read(self.HEADER_SIZE)
+        except OSError as e:
+            print(f"Error reading {file_path}: {e}")
+            return ()
+
+        content_types = self.detect(header)
+        self.__cache[cache_key] = content_types
+        if len(self.__cache) > self.__cache_size:
+            self.__cache.popitem(last=False)
+        return content_types
+
+    @staticmethod
+    def detect(header: bytes) -> Tuple[str, ...]:
+        for name, offset, magic in SIGNATURES:
+            if header.startswith(magic, offset):
+                return ContentSniffer.__refine(name, header)
+        return ()
+
+    @staticmethod
+    def __refine(name: str, header: bytes) -> Tuple[str, ...]:
+        if name == "zip":
+            for marker_name, marker in ZIP_MARKERS:
+                if marker in header:
+                    return marker_name, "zip"
+        elif name == "riff":
+            riff_format = RIFF_FORMATS.get(header[8:12])
+            return (riff_format, "riff") if riff_format else ("riff",)
+        elif name == "mp4":
+            brand = FTYP_BRANDS.get(header[8:12])
+            return (brand, "mp4") if brand else ("mp4",)
+        elif name == "mkv" and b"webm" in header[:64]:
+            return "webm", "mkv"
+        return name,
+
@@ -0,0 +1,154 @@
+import datetime
+import errno
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from send2trash import send2trash
+
+from models.plan import PlannedDeletion
+
+
+class DeletionExecutor:
+    """
+    Runs the lifecycle actions of an audit as a batch, instead of one blocking call per item.
+
+    - 'trash': items are grouped by device (mount point) and each group is sent with a single send2trash
+      call. If a group fails, its remaining items are sent one by one, so one failure does not hold back
+      the others.
+    - 'delete': files are removed on the caller's thread, folders are removed on a thread pool.
+    - With a soft delete window, 'delete' items are moved with a single rename into the zone's holding
+      area, in a folder named after the day they are purged. purge() removes each due folder at once.
+
+    Failures are reported per item and never abort the batch.
+    """
+
+    # Holding area, at the root of the zone's destination (a rename never leaves the filesystem)
+    HOLDING_FOLDER = ".nexus-holding"
+
+    def __init__(self, destination_path: Path, soft_delete_days: int = 0, max_workers: int = 4):
+        self.__destination_path = destination_path
+        self.__soft_delete_days = soft_delete_days
+        self.__max_workers = max_workers
+
+    @property
+    def holding_path(self) -> Path:
+        return self.__destination_path / self.HOLDING_FOLDER
+
+    def execute(self, deletions: List[PlannedDeletion]) -> List[Optional[Exception]]:
+        """
+        :return: For each deletion, in order, None if it succeeded or the error it failed with.
+        """
+        errors: List[Optional[Exception]] = [None] * len(deletions)
+
+        # Index of every item to trash, per device
+        trash_groups: Dict[int, List[int]] = defaultdict(list)
+        folder_removals: Dict[Future, int] = {}
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix="delete") as thread_pool:
+            for index, planned_deletion in enumerate(deletions):
+                item_path = planned_deletion.ordered_file.path
+
+                try:
+                    if planned_deletion.action == 'trash':
+                        trash_groups[os.lstat(item_path).st_dev].append(index)
+                    elif self.__soft_delete_days > 0 and self.__hold(Path(item_path)):
+                        continue
+                    elif os.path.isdir(item_path) and not os.path.islink(item_path):
+                        folder_removals[thread_pool.submit(shutil.rmtree, item_path)] = index
+                    else:
+                        os.remove(item_path)
+                except OSError as e:
+                    errors[index] = e
+
+            # Trash calls run while the pool removes the folders
+            for indexes in trash_groups.values():
+                self.__trash_group([deletions[index].ordered_file.path for index in indexes], indexes, errors)
+
+            for future, index in folder_removals.items():
+                error = future.exception()
+                if error is not None:
+                    errors[index] = error
+
+        return errors
+
+    def purge(self, today: datetime.date) -> int:
+        """
+        Permanently remove the held items whose soft delete window is over.
+
+        :return: The number of day folders purged.
+        """
+        try:
+            due_folders = [entry.path for entry in os.scandir(self.holding_path)
+                           if entry.is_dir(follow_symlinks=False) and entry.name <= today.isoformat()]
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"Error listing {self.holding_path}: {e}")
+            return 0
+
+        purged_count = 0
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix="purge") as thread_pool:
+            removals = {thread_pool.submit(shutil.rmtree, folder_path): folder_path for folder_path in due_folders}
+            for future, folder_path in removals.items():
+                error = future.exception()
+                if error is not None:
+                    print(f"Error purging {folder_path}: {error}")
+                else:
+                    purged_count += 1
+
+        # The holding area only exists while it holds items
+        try:
+            with os.scandir(self.holding_path) as entries:
+                is_empty = not any(entries)
+            if is_empty:
+                os.rmdir(self.holding_path)
+        except OSError:
+            pass
+        return purged_count
+
+    def __hold(self, item_path: Path) -> bool:
+        """
+        Move an item into the holding area, keeping its path relative to the destination.
+
+        :return: False when the item cannot be held (outside of the destination, or on another device).
+        """
+        try:
+            relative_path = item_path.relative_to(self.__destination_path)
+        except ValueError:
+            return False
+
+        purge_date = datetime.date.today() + datetime.timedelta(days=self.__soft_delete_days)
+        held_path = self.holding_path / purge_date.isoformat() / relative_path
+        if os.path.lexists(held_path):
+            held_path = held_path.with_name(f"{held_path.name}.{uuid.uuid4().hex[:8]}")
+
+        held_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(item_path, held_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            return False
+        return True
+
+    @staticmethod
+    def __trash_group(paths: List[str], indexes: List[int], errors: List[Optional[Exception]]) -> None:
+        try:
+            send2trash(paths)
+            return
+        except Exception:
+            pass
+
+        # Items trashed before the failure are gone, the others are sent one by one
+        for path, index in zip(paths, indexes):
+            if not os.path.lexists(path):
+                continue
+            try:
+                send2trash(path)
+            except Exception as e:
+                errors[index] = e
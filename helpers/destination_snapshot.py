@@ -0,0 +1,130 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.state_store import StateStore
+
+# Kind of each directory entry kept in the snapshot
+ENTRY_FILE = 0
+ENTRY_DIRECTORY = 1
+# Symlink to a directory: counts as a folder but is not descended into (same as Path.rglob)
+ENTRY_LINKED_DIRECTORY = 2
+
+ROOT_DIRECTORY = "."
+
+
+class DestinationSnapshot:
+    """
+    Listing of a zone's destination tree, persisted between runs.
+
+    A directory's mtime only changes when entries are added, removed or renamed inside it,
+    so directories whose (mtime, inode, device) did not change since the last run are not
+    listed again: their children are taken from the snapshot. Each run then costs one stat
+    per directory instead of one or more syscalls per entry.
+    """
+
+    STATE_KEY = "destination_snapshot"
+
+    # Directories modified this close to the previous snapshot are listed again, since a change
+    # within the same mtime tick (or with a slightly skewed clock on a network share) is invisible
+    RACY_SECONDS = 5
+
+    def __init__(self, zone_name: str, destination_path: Path, state_store: StateStore):
+        self.__zone_name = zone_name
+        self.__destination_path = destination_path
+        self.__state_store = state_store
+
+        # Relative directory -> {entry name: entry kind}
+        self.listings: Dict[str, Dict[str, int]] = {}
+        self.__signatures: Dict[str, list] = {}
+        self.__taken_at_ns = 0
+
+        self.scanned_directories_count = 0
+        self.reused_directories_count = 0
+
+    def refresh(self) -> Dict[str, Dict[str, int]]:
+        """
+        Bring the listings up to date with the disk.
+
+        :return: Relative directory path ('.' for the destination root) -> {entry name: entry kind}.
+        """
+        previous_state = self.__state_store.load(self.__zone_name, self.STATE_KEY) or {}
+        previous_directories = previous_state.get("directories", {})
+        racy_limit_ns = previous_state.get("takenAt", 0) - self.RACY_SECONDS * 1_000_000_000
+
+        self.__taken_at_ns = time.time_ns()
+        self.listings = {}
+        self.__signatures = {}
+        self.scanned_directories_count = 0
+        self.reused_directories_count = 0
+
+        pending_directories = [(ROOT_DIRECTORY, str(self.__destination_path), None)]
+
+        while pending_directories:
+            relative_path, absolute_path, directory_stat = pending_directories.pop()
+
+            try:
+                if directory_stat is None:
+                    directory_stat = os.stat(absolute_path)
+            except OSError:
+                continue
+
+            signature = [directory_stat.st_mtime_ns, directory_stat.st_ino, directory_stat.st_dev]
+            previous_directory = previous_directories.get(relative_path)
+
+            children: Optional[Dict[str, int]] = None
+            child_stats = {}
+
+            if (previous_directory and previous_directory[:3] == signature
+                    and signature[0] < racy_limit_ns):
+                children = previous_directory[3]
+                self.reused_directories_count += 1
+            else:
+                children, child_stats = self.__list_directory(absolute_path)
+                if children is None:
+                    continue
+                self.scanned_directories_count += 1
+
+            self.listings[relative_path] = children
+            self.__signatures[relative_path] = signature
+
+            for name, kind in children.items():
+                if kind == ENTRY_DIRECTORY:
+                    child_relative_path = name if relative_path == ROOT_DIRECTORY \
+                        else os.path.join(relative_path, name)
+                    pending_directories.append((child_relative_path, os.path.join(absolute_path, name),
+                                                child_stats.get(name)))
+
+        return self.listings
+
+    def save(self) -> None:
+        directories = {relative_path: signature + [self.listings[relative_path]]
+                       for relative_path, signature in self.__signatures.items()}
+        self.__state_store.save(self.__zone_name, self.STATE_KEY,
+                                {"takenAt": self.__taken_at_ns, "directories": directories})
+
+    @staticmethod
+    def __list_directory(absolute_path: str):
+        """ List a directory with a single scandir, reusing the DirEntry type and stat data. """
+        children = {}
+        child_stats = {}
+
+        try:
+            with os.scandir(absolute_path) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_dir():
+                            children[entry.name] = ENTRY_FILE
+                        elif entry.is_symlink():
+                            children[entry.name] = ENTRY_LINKED_DIRECTORY
+                        else:
+                            children[entry.name] = ENTRY_DIRECTORY
+                            child_stats[entry.name] = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        children.setdefault(entry.name, ENTRY_FILE)
+        except OSError as e:
+            print(f"Error listing {absolute_path}: {e}")
+            return None, None
+
+        return children, child_stats
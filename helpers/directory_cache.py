@@ -0,0 +1,63 @@
+import os
+import threading
+from pathlib import Path
+from typing import Set
+
+from services.state_store import StateStore
+
+
+class DirectoryCache:
+    """
+    Folders of a zone already known to exist, so creating them again costs no syscall.
+
+    The cache is emptied at the start of every run, unless it is persistent: then it is kept
+    between runs in the state store. An entry is only dropped when a move into the folder fails
+    because the folder is gone (ENOENT), after which the folder is created again.
+    """
+
+    STATE_KEY = "directory_cache"
+
+    def __init__(self, zone_name: str, state_store: StateStore, persistent: bool = False):
+        self.__zone_name = zone_name
+        self.__state_store = state_store
+        self.__persistent = persistent
+
+        self.__known_paths: Set[str] = set()
+        self.__lock = threading.Lock()
+
+    def reset(self) -> None:
+        """ Start a run: forget every folder, or reload the persisted ones. """
+        known_paths = set()
+        if self.__persistent:
+            known_paths = set(self.__state_store.load(self.__zone_name, self.STATE_KEY) or [])
+
+        with self.__lock:
+            self.__known_paths = known_paths
+
+    def save(self) -> None:
+        if not self.__persistent:
+            return
+
+        with self.__lock:
+            known_paths = sorted(self.__known_paths)
+        self.__state_store.save(self.__zone_name, self.STATE_KEY, known_paths)
+
+    def ensure(self, folder_path: Path) -> None:
+        """ Create the folder (and its parents) unless it is already known to exist. """
+        key = str(folder_path)
+        if key in self.__known_paths:
+            return
+
+        os.makedirs(folder_path, exist_ok=True)
+
+        with self.__lock:
+            self.__known_paths.add(key)
+
+    def invalidate(self, folder_path: Path) -> None:
+        """ Forget the folder and every folder below it. """
+        key = str(folder_path)
+        prefix = os.path.join(key, "")
+
+        with self.__lock:
+            self.__known_paths = {known_path for known_path in self.__known_paths
+                                  if known_path != key and not known_path.startswith(prefix)}
@@ -1,13 +1,16 @@
-import os
+from pathlib import Path
 
+from helpers.directory_cache import DirectoryCache
 from services.path_repository import PathRepository
 from services.settings_repository import SettingsRepository
 
 
 class DirectoryCreator:
-    def __init__(self, path_repository: PathRepository, settings_repository: SettingsRepository):
+    def __init__(self, path_repository: PathRepository, settings_repository: SettingsRepository,
+                 directory_cache: DirectoryCache):
         self.__path_repository = path_repository
         self.__settings_repository = settings_repository
+        self.__directory_cache = directory_cache
 
     def execute(self) -> None:
         destination_path = self.__path_repository.get_destination_path()
@@ -15,4 +18,4 @@ class DirectoryCreator:
 
         for rule in sorting_rules:
             if rule.destination_folder:
-                os.makedirs(os.path.join(destination_path, rule.destination_folder), exist_ok=True)
+                self.__directory_cache.ensure(Path(destination_path) / rule.destination_folder)
@@ -0,0 +1,190 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class WatchEvent(NamedTuple):
+    """
+    A change to a direct child of a watched directory.
+    An entry name of None means the watcher lost track of the directory (e.g. event queue
+    overflow) and it must be rescanned.
+    """
+    directory: Path
+    name: Optional[str]
+
+    # True when the writer is known to be done (file closed after writing or moved into place)
+    write_complete: bool = False
+
+
+class DirectoryWatcher(ABC):
+    """ Reports changes to the direct children of a set of directories. """
+
+    @abstractmethod
+    def add_directory(self, directory: Path) -> None:
+        pass
+
+    @abstractmethod
+    def read_events(self, timeout: Optional[float]) -> List[WatchEvent]:
+        """
+        Block until at least one change is available or the timeout expires.
+
+        :param timeout: Maximum number of seconds to wait, None to wait indefinitely.
+        :return: The changes observed, possibly empty if the timeout expired.
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class InotifyDirectoryWatcher(DirectoryWatcher):
+    """
+    Linux inotify backend. The process sleeps in poll() until the kernel reports an event,
+    so an idle watcher costs no CPU at all.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_MODIFY
+
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        self.__libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+        self.__file_descriptor = self.__libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.__file_descriptor < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+
+        self.__directories_by_watch: Dict[int, Path] = {}
+
+        self.__poller = select.poll()
+        self.__poller.register(self.__file_descriptor, select.POLLIN)
+
+    def add_directory(self, directory: Path) -> None:
+        watch_descriptor = self.__libc.inotify_add_watch(self.__file_descriptor, os.fsencode(directory),
+                                                         self.WATCH_MASK)
+        if watch_descriptor < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number), str(directory))
+
+        self.__directories_by_watch[watch_descriptor] = directory
+
+    def read_events(self, timeout: Optional[float]) -> List[WatchEvent]:
+        timeout_ms = None if timeout is None else max(0, int(timeout * 1000))
+        if not self.__poller.poll(timeout_ms):
+            return []
+
+        try:
+            buffer = os.read(self.__file_descriptor, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events: List[WatchEvent] = []
+        offset = 0
+
+        while offset < len(buffer):
+            watch_descriptor, mask, _, name_length = self.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.EVENT_HEADER.size
+            raw_name = buffer[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.extend(WatchEvent(directory, None) for directory in self.__directories_by_watch.values())
+                continue
+
+            directory = self.__directories_by_watch.get(watch_descriptor)
+            if directory is None or mask & self.IN_IGNORED or not raw_name:
+                continue
+
+            # Folders never report close-write, their contents may still be arriving
+            write_complete = bool(mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO)) and not mask & self.IN_ISDIR
+            events.append(WatchEvent(directory, os.fsdecode(raw_name), write_complete))
+
+        return events
+
+    def close(self) -> None:
+        os.close(self.__file_descriptor)
+
+
+class PollingDirectoryWatcher(DirectoryWatcher):
+    """
+    Portable fallback: lists every watched directory at a fixed interval and reports
+    the entries that are new or whose size or modification time changed.
+    """
+
+    def __init__(self, poll_interval: float = 2.0):
+        self.__poll_interval = poll_interval
+        self.__snapshots: Dict[Path, Dict[str, Tuple[int, int]]] = {}
+        self.__next_poll = time.monotonic()
+
+    @property
+    def poll_interval(self) -> float:
+        return self.__poll_interval
+
+    def add_directory(self, directory: Path) -> None:
+        self.__snapshots[directory] = self.__take_snapshot(directory)
+
+    def read_events(self, timeout: Optional[float]) -> List[WatchEvent]:
+        wait_seconds = max(0.0, self.__next_poll - time.monotonic())
+        if timeout is not None and timeout < wait_seconds:
+            time.sleep(timeout)
+            return []
+
+        time.sleep(wait_seconds)
+        self.__next_poll = time.monotonic() + self.__poll_interval
+
+        events: List[WatchEvent] = []
+        for directory, previous_snapshot in self.__snapshots.items():
+            current_snapshot = self.__take_snapshot(directory)
+            events.extend(WatchEvent(directory, name) for name, signature in current_snapshot.items()
+                          if previous_snapshot.get(name) != signature)
+            self.__snapshots[directory] = current_snapshot
+
+        return events
+
+    @staticmethod
+    def __take_snapshot(directory: Path) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    snapshot[entry.name] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+        except OSError as e:
+            print(f"Error scanning {directory}: {e}")
+        return snapshot
+
+    def close(self) -> None:
+        self.__snapshots.clear()
+
+
+def create_directory_watcher(force_polling: bool = False, poll_interval: float = 2.0) -> DirectoryWatcher:
+    """ Use inotify on Linux and fall back to polling everywhere else (or if inotify is unavailable). """
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyDirectoryWatcher()
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available, falling back to polling: {e}")
+
+    return PollingDirectoryWatcher(poll_interval)
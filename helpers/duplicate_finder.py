@@ -0,0 +1,326 @@
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from services.state_store import StateStore
+
+
+class DuplicateCandidate(NamedTuple):
+    source_path: Path
+    size: int
+    # Where the file would be moved: it is compared with the files of this folder
+    destination_path: Path
+
+
+class _ContentFile:
+    __slots__ = ("path", "size", "signature", "partial_hash", "full_hash", "candidate")
+
+    def __init__(self, path: str, size: int, signature: list, entry: Optional[list] = None,
+                 candidate: Optional[DuplicateCandidate] = None):
+        self.path = path
+        self.size = size
+        self.signature = signature
+        self.candidate = candidate
+
+        # Hashes from the index are only reused while the file keeps the same size, mtime and inode
+        is_entry_valid = entry is not None and entry[:3] == signature
+        self.partial_hash: Optional[str] = entry[3] if is_entry_valid else None
+        self.full_hash: Optional[str] = entry[4] if is_entry_valid else None
+
+    def to_entry(self) -> list:
+        return [*self.signature, self.partial_hash, self.full_hash]
+
+
+class DuplicateFinder:
+    """
+    Finds the files about to be moved whose content is already in their destination folder.
+
+    Files are compared in three passes, each one only over the files the previous one could not tell
+    apart: by size, by a hash of their first and last bytes, and by a hash of their whole content
+    (streamed, on a thread pool). Hashes are kept between runs in a per-zone index of the destination,
+    keyed on (size, mtime, inode), so an unchanged destination file is never read twice. The hashes of
+    the source files are kept too, so a duplicate left in the source is not read again on every run.
+    """
+
+    STATE_KEY = "content_hashes"
+
+    # Bytes hashed at each end of a file for the partial hash
+    PARTIAL_HASH_SIZE = 64 * 1024
+
+    CHUNK_SIZE = 1024 * 1024
+    HASH_WORKERS = 4
+
+    def __init__(self, zone_name: str, destination_path: Path, state_store: StateStore):
+        self.__zone_name = zone_name
+        self.__destination_path = destination_path
+        self.__state_store = state_store
+
+        # Relative folder -> {name: [size, mtime_ns, inode, partial hash, full hash]}
+        self.__destination_entries: Optional[Dict[str, Dict[str, list]]] = None
+        # Source path -> same entry, for the candidates of the current run
+        self.__source_entries: Dict[str, list] = {}
+        self.__seen_source_paths: Set[str] = set()
+        self.__is_dirty = False
+
+    def find_duplicates(self, candidates: List[DuplicateCandidate]) -> Dict[Path, Path]:
+        """
+        Compare each candidate with the files of its destination folder and with the other candidates.
+
+        :param candidates: Files about to be moved, in the order they would be moved.
+        :return: Source path of every duplicate -> the file with the same content (a file of the
+                 destination folder, or the source path of an earlier candidate).
+        """
+        self.__load()
+
+        # Empty files all have the same content, they are never duplicates of each other
+        candidates_by_folder: Dict[Path, List[DuplicateCandidate]] = defaultdict(list)
+        for candidate in candidates:
+            if candidate.size > 0:
+                candidates_by_folder[candidate.destination_path.parent].append(candidate)
+
+        # 1. Size: only the files sharing their size with a candidate are compared any further
+        size_groups: List[List[_ContentFile]] = []
+        for folder_path, folder_candidates in candidates_by_folder.items():
+            candidate_sizes = {candidate.size for candidate in folder_candidates}
+
+            files_by_size: Dict[int, List[_ContentFile]] = defaultdict(list)
+            for content_file in self.__list_destination_folder(folder_path, candidate_sizes):
+                files_by_size[content_file.size].append(content_file)
+            for candidate in folder_candidates:
+                content_file = self.__get_candidate_file(candidate)
+                if content_file:
+                    files_by_size[content_file.size].append(content_file)
+
+            size_groups.extend(group for group in files_by_size.values() if self.__is_comparable(group))
+
+        if not size_groups:
+            return {}
+
+        duplicates: Dict[Path, Path] = {}
+        with ThreadPoolExecutor(max_workers=self.HASH_WORKERS, thread_name_prefix="hash") as thread_pool:
+            # 2. Partial hash
+            partial_groups = self.__split_groups(thread_pool, size_groups, self.__compute_partial_hash,
+                                                 lambda content_file: content_file.partial_hash)
+
+            # 3. Full hash
+            full_groups = self.__split_groups(thread_pool, partial_groups, self.__compute_full_hash,
+                                              lambda content_file: content_file.full_hash)
+
+        # 4. Destination files come first in each group, then the candidates in their move order
+        for group in full_groups:
+            original_path = None
+            for content_file in group:
+                if content_file.candidate is None:
+                    original_path = original_path or Path(content_file.path)
+                elif original_path is None:
+                    # The caller decides where that candidate goes (its name may be taken)
+                    original_path = content_file.candidate.source_path
+                else:
+                    duplicates[content_file.candidate.source_path] = original_path
+
+        self.__store_entries(file for group in size_groups for file in group)
+        return duplicates
+
+    def is_same_content(self, source_path: Path, copy_path: Path) -> bool:
+        """
+        Check again that a duplicate has the content of its copy, right before it is trashed or replaced by a link
+        (a plan may be applied later, the copy may have been replaced since it was hashed).
+        Stored hashes are reused while a file keeps the signature it was hashed with, the other files are read.
+        """
+        self.__load()
+
+        content_files = []
+        for path in (source_path, copy_path):
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                return False
+            content_files.append(_ContentFile(str(path), file_stat.st_size, self.__get_signature(file_stat),
+                                              self.__get_entry(Path(path))))
+
+        source_file, copy_file = content_files
+        if source_file.size != copy_file.size:
+            return False
+
+        for content_file in content_files:
+            if content_file.full_hash is None:
+                self.__compute_full_hash(content_file)
+        return source_file.full_hash is not None and source_file.full_hash == copy_file.full_hash
+
+    def record_moved(self, source_path: Path, destination_path: Path) -> None:
+        """ Keep the hashes of a candidate that was moved, now under its destination path. """
+        entry = self.__source_entries.pop(str(source_path), None)
+        if entry is None or self.__destination_entries is None:
+            return
+
+        try:
+            destination_stat = os.stat(destination_path)
+        except OSError:
+            return
+
+        # A move keeps the size and mtime (a rename also keeps the inode, a copy between disks does not)
+        signature = self.__get_signature(destination_stat)
+        if signature[:2] != entry[:2]:
+            return
+
+        content_file = _ContentFile(str(destination_path), destination_stat.st_size, signature,
+                                    [*signature, entry[3], entry[4]])
+        folder_entries = self.__destination_entries.setdefault(self.__get_relative_folder(destination_path.parent), {})
+        folder_entries[destination_path.name] = content_file.to_entry()
+        self.__is_dirty = True
+
+    def save(self) -> None:
+        """ Persist the index, keeping only the source files seen since the last save. """
+        if self.__destination_entries is None:
+            return
+
+        stale_source_paths = self.__source_entries.keys() - self.__seen_source_paths
+        for source_path in stale_source_paths:
+            del self.__source_entries[source_path]
+        self.__seen_source_paths = set()
+
+        if not self.__is_dirty and not stale_source_paths:
+            return
+
+        self.__state_store.save(self.__zone_name, self.STATE_KEY,
+                                {"destination": self.__destination_entries, "source": self.__source_entries})
+        self.__is_dirty = False
+
+    def __load(self) -> None:
+        if self.__destination_entries is not None:
+            return
+
+        state = self.__state_store.load(self.__zone_name, self.STATE_KEY) or {}
+        self.__destination_entries = state.get("destination", {})
+        self.__source_entries = state.get("source", {})
+
+    def __list_destination_folder(self, folder_path: Path, sizes: Set[int]) -> List[_ContentFile]:
+        """ Files of the folder having one of the given sizes. The folder's index is rebuilt from the listing. """
+        relative_folder = self.__get_relative_folder(folder_path)
+        previous_entries = self.__destination_entries.get(relative_folder, {})
+        folder_entries: Dict[str, list] = {}
+        content_files = []
+
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+
+                    content_file = _ContentFile(entry.path, entry_stat.st_size, self.__get_signature(entry_stat),
+                                                previous_entries.get(entry.name))
+                    folder_entries[entry.name] = content_file.to_entry()
+                    if content_file.size in sizes:
+                        content_files.append(content_file)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error listing {folder_path}: {e}")
+            return []
+
+        if folder_entries != previous_entries:
+            self.__destination_entries[relative_folder] = folder_entries
+            self.__is_dirty = True
+        return content_files
+
+    def __get_entry(self, path: Path) -> Optional[list]:
+        """ Stored entry of a source candidate or of a destination file. """
+        entry = self.__source_entries.get(str(path))
+        if entry is not None:
+            return entry
+        return self.__destination_entries.get(self.__get_relative_folder(path.parent), {}).get(path.name)
+
+    def __get_candidate_file(self, candidate: DuplicateCandidate) -> Optional[_ContentFile]:
+        try:
+            source_stat = os.stat(candidate.source_path)
+        except OSError:
+            return None
+
+        source_path = str(candidate.source_path)
+        self.__seen_source_paths.add(source_path)
+        return _ContentFile(source_path, source_stat.st_size, self.__get_signature(source_stat),
+                            self.__source_entries.get(source_path), candidate)
+
+    def __store_entries(self, content_files) -> None:
+        for content_file in content_files:
+            entry = content_file.to_entry()
+
+            if content_file.candidate is not None:
+                if self.__source_entries.get(content_file.path) != entry:
+                    self.__source_entries[content_file.path] = entry
+                    self.__is_dirty = True
+                continue
+
+            folder_path, name = os.path.split(content_file.path)
+            folder_entries = self.__destination_entries.setdefault(self.__get_relative_folder(Path(folder_path)), {})
+            if folder_entries.get(name) != entry:
+                folder_entries[name] = entry
+                self.__is_dirty = True
+
+    def __split_groups(self, thread_pool: ThreadPoolExecutor, groups: List[List[_ContentFile]],
+                       compute_hash, get_hash) -> List[List[_ContentFile]]:
+        """ Hash the files of the groups that do not have the hash yet, and split each group by hash. """
+        files_to_hash = [content_file for group in groups for content_file in group if get_hash(content_file) is None]
+        for _ in thread_pool.map(compute_hash, files_to_hash):
+            pass
+
+        split_groups = []
+        for group in groups:
+            files_by_hash: Dict[str, List[_ContentFile]] = defaultdict(list)
+            for content_file in group:
+                # Files that could not be read are left out of the comparison
+                if get_hash(content_file) is not None:
+                    files_by_hash[get_hash(content_file)].append(content_file)
+            split_groups.extend(sub_group for sub_group in files_by_hash.values() if self.__is_comparable(sub_group))
+        return split_groups
+
+    @classmethod
+    def __compute_partial_hash(cls, content_file: _ContentFile) -> None:
+        try:
+            with open(content_file.path, 'rb') as file:
+                content_hash = hashlib.blake2b(digest_size=16)
+                content_hash.update(file.read(cls.PARTIAL_HASH_SIZE))
+                if content_file.size > 2 * cls.PARTIAL_HASH_SIZE:
+                    file.seek(-cls.PARTIAL_HASH_SIZE, os.SEEK_END)
+                content_hash.update(file.read(cls.PARTIAL_HASH_SIZE))
+        except OSError as e:
+            print(f"Error hashing {content_file.path}: {e}")
+            return
+
+        content_file.partial_hash = content_hash.hexdigest()
+
+        # Both ends cover the whole file: the partial hash is the full one
+        if content_file.size <= 2 * cls.PARTIAL_HASH_SIZE:
+            content_file.full_hash = content_file.partial_hash
+
+    @classmethod
+    def __compute_full_hash(cls, content_file: _ContentFile) -> None:
+        content_hash = hashlib.blake2b(digest_size=16)
+        try:
+            with open(content_file.path, 'rb') as file:
+                while chunk := file.read(cls.CHUNK_SIZE):
+                    content_hash.update(chunk)
+        except OSError as e:
+            print(f"Error hashing {content_file.path}: {e}")
+            return
+
+        content_file.full_hash = content_hash.hexdigest()
+
+    @staticmethod
+    def __is_comparable(group: List[_ContentFile]) -> bool:
+        """ A group is only worth hashing if it holds a candidate and at least one other file. """
+        return len(group) > 1 and any(content_file.candidate is not None for content_file in group)
+
+    @staticmethod
+    def __get_signature(file_stat: os.stat_result) -> list:
+        return [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino]
+
+    def __get_relative_folder(self, folder_path: Path) -> str:
+        return os.path.relpath(folder_path, self.__destination_path)
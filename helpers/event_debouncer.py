@@ -0,0 +1,33 @@
+import time
+from typing import Dict, Hashable, List, Optional
+
+
+class EventDebouncer:
+    """
+    Coalesces repeated events for the same key. A key becomes ready once no new event
+    arrived for it during its delay; every new event restarts the delay.
+    """
+
+    def __init__(self):
+        self.__deadlines: Dict[Hashable, float] = {}
+
+    def add(self, key: Hashable, delay: float) -> None:
+        self.__deadlines[key] = time.monotonic() + delay
+
+    def pop_ready(self) -> List[Hashable]:
+        now = time.monotonic()
+        ready_keys = [key for key, deadline in self.__deadlines.items() if deadline <= now]
+
+        for key in ready_keys:
+            del self.__deadlines[key]
+
+        return ready_keys
+
+    def time_until_next(self) -> Optional[float]:
+        """ Seconds until the next key becomes ready, or None if nothing is pending. """
+        if not self.__deadlines:
+            return None
+        return max(0.0, min(self.__deadlines.values()) - time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self.__deadlines)
@@ -0,0 +1,91 @@
+import datetime
+import os
+import pathlib
+import time
+from typing import Optional, Tuple
+
+from helpers.rule_matcher import RuleMatcher
+from models.models import OrderedFile, SortingRule
+from models.plan import PlannedMove
+
+
+class FileClassifier:
+    """
+    Decides where a file goes: the rule it matches and the move that rule asks for.
+
+    It only holds the compiled rules and the zone's settings, so it can be pickled and shared
+    with the worker processes that sort a large 'process_contents' folder.
+    """
+
+    def __init__(self, rule_matcher: RuleMatcher, destination_path: pathlib.Path, size_limit_in_mb: int,
+                 settle_seconds: float = 0):
+        self.__rule_matcher = rule_matcher
+        self.__destination_path = destination_path
+        self.__size_limit = size_limit_in_mb * 1024 * 1024
+        self.__settle_seconds = settle_seconds
+
+    def get_settle_delay(self, file_stat: os.stat_result) -> float:
+        """
+        :param file_stat: Stat of the file, taken while listing its folder.
+        :return: Seconds until the file has been left unchanged for settle_seconds, 0 if it already has.
+        """
+        if self.__settle_seconds <= 0:
+            return 0.0
+
+        # A modification time in the future (clock of a network share) waits one interval at most
+        return min(self.__settle_seconds, max(0.0, file_stat.st_mtime + self.__settle_seconds - time.time()))
+
+    def classify(self, file_path: pathlib.Path,
+                 file_stat: os.stat_result) -> Tuple[Optional[SortingRule], Optional[PlannedMove]]:
+        """
+        1. Check the file size.
+        2. Find the rule that matches the file.
+        3. Build the move to the rule's destination folder.
+
+        :param file_stat: Stat of the file, taken while listing its folder.
+        :return: The matched rule (None when the file is too large or no rule takes it) and its move
+                 (None when the file stays).
+        """
+        # 1. Check file size (the file existed when its folder was listed)
+        if self.is_too_large(file_stat):
+            return None, None
+
+        # 2. Find destination folder and rule (content rules may read the file's header)
+        item_rule = self.__rule_matcher.match_file(str(file_path), file_stat)
+
+        # 2.1 The file stays when no rule takes it (e.g. outside the conditions of every rule matching its
+        # name), when its rule has nowhere to put it, or when the handling strategy is ignore
+        if item_rule is None or not item_rule.destination_folder or item_rule.handlingStrategy == 'ignore':
+            return item_rule, None
+
+        # 3. Build the move
+        return item_rule, self.build_move(file_path, item_rule)
+
+    def is_too_large(self, file_stat: os.stat_result) -> bool:
+        return file_stat.st_size >= self.__size_limit
+
+    def build_move(self, file_path: pathlib.Path, rule: SortingRule) -> PlannedMove:
+        """ Move of a file into the rule's destination folder, with the registry entry it creates. """
+        final_file_path = self.__destination_path / rule.destination_folder / file_path.name
+
+        return PlannedMove(
+            source_path=file_path,
+            destination_path=final_file_path,
+            rule_name=rule.rule_name,
+            ordered_file=self.get_ordered_file(rule, final_file_path),
+        )
+
+    @staticmethod
+    def get_ordered_file(rule: SortingRule, destination_path: pathlib.Path) -> Optional[OrderedFile]:
+        """ Registry entry of an item moved by the rule, None if the rule has no active lifecycle. """
+        if not (rule and rule.lifecycle and rule.lifecycle.enabled):
+            return None
+
+        today = datetime.datetime.now().date()
+        return OrderedFile(
+            name=destination_path.name,
+            ordered_date=today,
+            path=str(destination_path),
+            rule_name_applied=rule.rule_name,
+            expiry_date=rule.lifecycle.get_expiry_date(today),
+        )
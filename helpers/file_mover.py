@@ -0,0 +1,184 @@
+import errno
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+from services.state_store import StateStore
+
+# Phases of a cross-device move recorded in the journal
+PHASE_COPYING = "copying"
+PHASE_COMMITTED = "committed"
+
+
+class FileMover:
+    """
+    Moves files and folders, with a rename when possible and a crash-safe copy otherwise.
+
+    Within a filesystem a move is a single os.rename. Across devices the item is copied under a
+    temporary name next to its destination (with copy_file_range or sendfile, so the data does not
+    go through Python), renamed into place, and only then is the source removed. Every cross-device
+    move of a folder or a large file is journaled: after an interruption, recover() deletes half-copied
+    temporaries (the source is still in place and is sorted again) or finishes removing the source of
+    a completed copy. Small files skip the journal and the fsync, which would cost more than the copy.
+    """
+
+    STATE_KEY = "move_journal"
+
+    # Bytes copied per system call
+    CHUNK_SIZE = 64 * 1024 * 1024
+
+    # Files from this size on are journaled and flushed to disk before the source is removed
+    JOURNALED_FILE_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, zone_name: str, state_store: StateStore, metrics_recorder: Optional[MetricsRecorder] = None):
+        self.__zone_name = zone_name
+        self.__state_store = state_store
+        self.__metrics_recorder = metrics_recorder or NullMetricsRecorder()
+
+        # Temporary path -> journal entry, for the moves in flight (moves may run on several threads)
+        self.__journal: Dict[str, Dict[str, str]] = {}
+        self.__journal_lock = threading.Lock()
+
+    def move(self, source_path: Path, destination_path: Path) -> None:
+        # 1. Same filesystem: a rename is atomic and does not touch the data.
+        # Only a move across devices (EXDEV) falls back to copying, any other failure is raised
+        try:
+            os.rename(source_path, destination_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+        # 2. Another device: copy to a temporary name, rename it into place, then remove the source
+        if os.path.islink(source_path):
+            # Same as shutil.move: the link itself is moved, not its target
+            os.symlink(os.readlink(source_path), destination_path)
+            os.unlink(source_path)
+            return
+
+        temp_path = destination_path.with_name(f".{destination_path.name}.{uuid.uuid4().hex[:8]}.partial")
+        is_folder = os.path.isdir(source_path)
+        is_journaled = is_folder or os.path.getsize(source_path) >= self.JOURNALED_FILE_SIZE
+
+        journal_entry = {"source": str(source_path), "destination": str(destination_path), "phase": PHASE_COPYING}
+        if is_journaled:
+            self.__record(temp_path, journal_entry)
+
+        try:
+            if is_folder:
+                shutil.copytree(source_path, temp_path, symlinks=True, copy_function=self.__copy_file)
+            else:
+                self.__copy_file(source_path, temp_path, flush=is_journaled)
+            os.replace(temp_path, destination_path)
+        except BaseException:
+            self.__remove_item(temp_path)
+            if is_journaled:
+                self.__record(temp_path, None)
+            raise
+
+        if is_journaled:
+            self.__record(temp_path, {**journal_entry, "phase": PHASE_COMMITTED})
+
+        self.__remove_item(source_path)
+
+        if is_journaled:
+            self.__record(temp_path, None)
+
+    def recover(self) -> int:
+        """
+        Finish or roll back the moves an interrupted run left in the journal.
+
+        :return: The number of moves recovered.
+        """
+        journal = self.__state_store.load(self.__zone_name, self.STATE_KEY)
+        if not journal:
+            return 0
+
+        for temp_path, entry in journal.items():
+            if entry["phase"] == PHASE_COPYING:
+                # The copy may be incomplete: drop it, the source is still in place
+                self.__remove_item(Path(temp_path))
+            elif entry["phase"] == PHASE_COMMITTED and os.path.lexists(entry["destination"]):
+                # The copy is in place, only the source was left behind
+                self.__remove_item(Path(entry["source"]))
+
+        self.__state_store.delete(self.__zone_name, self.STATE_KEY)
+        return len(journal)
+
+    def __record(self, temp_path: Path, entry: Optional[Dict[str, str]]) -> None:
+        with self.__journal_lock:
+            if entry is None:
+                self.__journal.pop(str(temp_path), None)
+            else:
+                self.__journal[str(temp_path)] = entry
+
+            if self.__journal:
+                self.__state_store.save(self.__zone_name, self.STATE_KEY, self.__journal)
+            else:
+                self.__state_store.delete(self.__zone_name, self.STATE_KEY)
+
+    def __copy_file(self, source_path, destination_path, flush: bool = True) -> None:
+        """ Copy the data and metadata of a file, flushed to disk before it is renamed into place. """
+        with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as destination_file:
+            size = os.fstat(source_file.fileno()).st_size
+            self.__copy_data(source_file.fileno(), destination_file.fileno(), size)
+            if flush:
+                os.fsync(destination_file.fileno())
+
+        shutil.copystat(source_path, destination_path)
+        self.__metrics_recorder.increment("bytes_copied", size)
+
+    @classmethod
+    def __copy_data(cls, source_fd: int, destination_fd: int, size: int) -> None:
+        offset = 0
+
+        # copy_file_range lets the filesystem copy in the kernel, or server-side on network shares
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(source_fd, destination_fd, min(cls.CHUNK_SIZE, size - offset))
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset >= size:
+                    return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+
+        # sendfile still avoids copying through user space
+        if hasattr(os, 'sendfile'):
+            try:
+                while offset < size:
+                    sent = os.sendfile(destination_fd, source_fd, offset, min(cls.CHUNK_SIZE, size - offset))
+                    if sent == 0:
+                        break
+                    offset += sent
+                if offset >= size:
+                    return
+            except OSError as e:
+                if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK):
+                    raise
+
+        os.lseek(source_fd, offset, os.SEEK_SET)
+        os.lseek(destination_fd, offset, os.SEEK_SET)
+        while True:
+            chunk = memoryview(os.read(source_fd, 1024 * 1024))
+            if not chunk:
+                break
+            while chunk:
+                chunk = chunk[os.write(destination_fd, chunk):]
+
+    @staticmethod
+    def __remove_item(path: Path) -> None:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
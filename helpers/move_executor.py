@@ -0,0 +1,128 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from helpers.directory_cache import DirectoryCache
+from helpers.file_mover import FileMover
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+
+
+class MoveStatistics(NamedTuple):
+    moved_count: int = 0
+    failed_count: int = 0
+    # Sum of the duration of every move (can exceed wall time when moves overlap)
+    busy_seconds: float = 0.0
+    # From the first submitted move until the last one finished
+    wall_seconds: float = 0.0
+
+
+class MoveExecutor:
+    """
+    Runs moves on a bounded thread pool while the caller keeps classifying items.
+    Callbacks are always invoked on the caller's thread, from submit() or wait(),
+    so the caller does not need any locking for its own state.
+    With a concurrency of 1, moves run inline without any thread.
+    """
+
+    def __init__(self, file_mover: FileMover, max_concurrent_moves: int = 1,
+                 directory_cache: Optional[DirectoryCache] = None,
+                 metrics_recorder: Optional[MetricsRecorder] = None):
+        self.__file_mover = file_mover
+        self.__directory_cache = directory_cache
+        self.__metrics_recorder = metrics_recorder or NullMetricsRecorder()
+        self.__max_concurrent_moves = max(1, max_concurrent_moves)
+        self.__thread_pool: Optional[ThreadPoolExecutor] = None
+        if self.__max_concurrent_moves > 1:
+            self.__thread_pool = ThreadPoolExecutor(max_workers=self.__max_concurrent_moves,
+                                                    thread_name_prefix="move")
+
+        self.__pending: Dict[Future, Tuple[Path, Callable[[], None], Callable[[Exception], None]]] = {}
+
+        self.__moved_count = 0
+        self.__failed_count = 0
+        self.__busy_seconds = 0.0
+        self.__first_submit_time: Optional[float] = None
+        self.__last_finish_time: Optional[float] = None
+
+    def __enter__(self) -> "MoveExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, source_path: Path, destination_path: Path,
+               on_success: Callable[[], None], on_error: Callable[[Exception], None]) -> None:
+        if self.__first_submit_time is None:
+            self.__first_submit_time = time.perf_counter()
+
+        if self.__thread_pool is None:
+            self.__finish(self.__run_move, (source_path, destination_path), on_success, on_error)
+            return
+
+        # Two moves to the same destination must not race each other
+        for future, (pending_destination, _, _) in list(self.__pending.items()):
+            if pending_destination == destination_path:
+                self.__collect([future])
+
+        # Keep the number of queued moves bounded
+        while len(self.__pending) >= self.__max_concurrent_moves * 2:
+            done, _ = wait(self.__pending, return_when=FIRST_COMPLETED)
+            self.__collect(done)
+
+        future = self.__thread_pool.submit(self.__run_move, source_path, destination_path)
+        self.__pending[future] = (destination_path, on_success, on_error)
+
+    def wait(self) -> None:
+        """ Block until every submitted move has finished and its callback has run. """
+        if self.__pending:
+            done, _ = wait(list(self.__pending))
+            self.__collect(done)
+
+    def close(self) -> None:
+        self.wait()
+        if self.__thread_pool is not None:
+            self.__thread_pool.shutdown()
+
+    @property
+    def statistics(self) -> MoveStatistics:
+        wall_seconds = 0.0
+        if self.__first_submit_time is not None and self.__last_finish_time is not None:
+            wall_seconds = self.__last_finish_time - self.__first_submit_time
+
+        return MoveStatistics(self.__moved_count, self.__failed_count, self.__busy_seconds, wall_seconds)
+
+    def __run_move(self, source_path: Path, destination_path: Path) -> float:
+        start_time = time.perf_counter()
+
+        try:
+            self.__file_mover.move(source_path, destination_path)
+        except FileNotFoundError:
+            # The destination folder may have been removed since it was cached: create it again, once
+            if self.__directory_cache is None or os.path.isdir(destination_path.parent):
+                raise
+            self.__directory_cache.invalidate(destination_path.parent)
+            self.__directory_cache.ensure(destination_path.parent)
+            self.__file_mover.move(source_path, destination_path)
+
+        return time.perf_counter() - start_time
+
+    def __collect(self, futures) -> None:
+        for future in futures:
+            _, on_success, on_error = self.__pending.pop(future)
+            self.__finish(future.result, (), on_success, on_error)
+
+    def __finish(self, get_duration, arguments, on_success, on_error) -> None:
+        try:
+            duration = get_duration(*arguments)
+            self.__busy_seconds += duration
+            self.__metrics_recorder.observe("operation_seconds", duration, operation="move")
+        except Exception as e:
+            self.__failed_count += 1
+            on_error(e)
+        else:
+            self.__moved_count += 1
+            on_success()
+        finally:
+            self.__last_finish_time = time.perf_counter()
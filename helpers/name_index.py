@@ -0,0 +1,106 @@
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+# Windows and macOS filesystems are case-insensitive by default: 'Report.pdf' takes the place of 'report.pdf'
+IS_CASE_INSENSITIVE = sys.platform in ('win32', 'darwin')
+
+# Stem of a name made unique by an earlier run, e.g. 'report (3)'
+NUMBERED_STEM_PATTERN = re.compile(r'^(.*) \((\d+)\)$')
+
+
+def _get_name_key(name: str) -> str:
+    return name.casefold() if IS_CASE_INSENSITIVE else name
+
+
+class _FolderNames:
+    __slots__ = ("names", "highest_numbers")
+
+    def __init__(self):
+        # Keys of every name taken in the folder
+        self.names: Set[str] = set()
+        # (stem key, extension key) -> highest number used in a 'stem (n).ext' name
+        self.highest_numbers: Dict[Tuple[str, str], int] = {}
+
+    def add(self, name: str, keep_extension: bool = True) -> None:
+        self.names.add(_get_name_key(name))
+
+        stem, extension = os.path.splitext(name) if keep_extension else (name, "")
+        numbered_stem = NUMBERED_STEM_PATTERN.match(stem) if stem.endswith(")") else None
+        if numbered_stem:
+            number_key = (_get_name_key(numbered_stem.group(1)), _get_name_key(extension))
+            number = int(numbered_stem.group(2))
+            if number > self.highest_numbers.get(number_key, 1):
+                self.highest_numbers[number_key] = number
+
+
+class DestinationNameIndex:
+    """
+    Names taken in each destination folder, to give every moved item a free name.
+
+    A folder is listed once, with a single scandir, the first time an item goes into it. Afterwards a free
+    name costs a set lookup: an item whose name is taken gets the next number after the highest one used
+    with the same stem and extension ('report (2).pdf', 'report (3).pdf'), without probing the disk.
+    Names given out are reserved right away, so the items of a run never take each other's place.
+    """
+
+    def __init__(self):
+        self.__folders: Dict[str, _FolderNames] = {}
+
+    def reset(self) -> None:
+        """ Forget every folder, they may have changed since the last run. """
+        self.__folders = {}
+
+    def reserve(self, destination_path: Path, keep_extension: bool = True) -> Path:
+        """
+        :param destination_path: Where the item would go.
+        :param keep_extension: Number the name before its extension ('report (2).pdf'), False for folders.
+        :return: The destination path itself if its name is free, else the path with the first free numbered name.
+        """
+        folder_names = self.__get_folder_names(destination_path.parent)
+        name = destination_path.name
+
+        if _get_name_key(name) in folder_names.names:
+            stem, extension = os.path.splitext(name) if keep_extension else (name, "")
+            number_key = (_get_name_key(stem), _get_name_key(extension))
+
+            number = folder_names.highest_numbers.get(number_key, 1) + 1
+            while _get_name_key(f"{stem} ({number}){extension}") in folder_names.names:
+                number += 1
+            name = f"{stem} ({number}){extension}"
+
+        folder_names.add(name, keep_extension)
+        return destination_path if name == destination_path.name else destination_path.with_name(name)
+
+    def add(self, item_path: Path) -> None:
+        """ Record an item placed in a folder by someone else (only needed once the folder was listed). """
+        folder_names = self.__folders.get(str(item_path.parent))
+        if folder_names is not None:
+            folder_names.add(item_path.name)
+
+    def release(self, item_path: Path) -> None:
+        """ Give back the name of an item that was not moved after all. """
+        folder_names = self.__folders.get(str(item_path.parent))
+        if folder_names is not None:
+            folder_names.names.discard(_get_name_key(item_path.name))
+
+    def __get_folder_names(self, folder_path: Path) -> _FolderNames:
+        folder_key = str(folder_path)
+        folder_names = self.__folders.get(folder_key)
+        if folder_names is not None:
+            return folder_names
+
+        folder_names = _FolderNames()
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    folder_names.add(entry.name)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error listing {folder_path}: {e}")
+
+        self.__folders[folder_key] = folder_names
+        return folder_names
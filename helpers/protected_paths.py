@@ -0,0 +1,58 @@
+import os
+import stat
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Tuple
+
+
+class ProtectedPaths:
+    """
+    Folders that must never be sorted away: every zone's destination and the folders containing it.
+
+    The paths are resolved once per run into a set of (device, inode) identities, so checking an
+    item costs a set lookup on the stat data the caller already has. Symlinked items are followed
+    with a single stat, which is enough to compare identities.
+    """
+
+    def __init__(self, protected_paths: List[Path]):
+        self.__protected_paths = protected_paths
+        self.__identities: FrozenSet[Tuple[int, int]] = frozenset()
+
+    def refresh(self) -> None:
+        """ Resolve the protected paths and their parents again (they may have been created or replaced). """
+        identities = set()
+
+        for protected_path in self.__protected_paths:
+            try:
+                resolved_path = protected_path.resolve()
+            except OSError as e:
+                print(f"Error resolving protected path {protected_path}: {e}")
+                continue
+
+            # An item that contains the destination is as dangerous as the destination itself
+            for path in (resolved_path, *resolved_path.parents):
+                try:
+                    path_stat = os.stat(path)
+                except OSError:
+                    continue
+                identities.add((path_stat.st_dev, path_stat.st_ino))
+
+        self.__identities = frozenset(identities)
+
+    def is_protected(self, item_path: Path, item_stat: os.stat_result) -> bool:
+        """
+        Check if the item is a protected folder or one of its parents.
+
+        :param item_path: The path of the item, only used to follow a symlink.
+        :param item_stat: The stat of the item itself (not followed), e.g. from a scandir entry.
+        :return: True if the item must not be sorted.
+        """
+        target_stat: Optional[os.stat_result] = item_stat
+
+        if stat.S_ISLNK(item_stat.st_mode):
+            try:
+                target_stat = os.stat(item_path)
+            except OSError:
+                # A broken link does not point to anything protected
+                return False
+
+        return (target_stat.st_dev, target_stat.st_ino) in self.__identities
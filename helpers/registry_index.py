@@ -0,0 +1,194 @@
+import bisect
+import datetime
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models.models import OrderedFile
+
+# Stored in the expiry column for items that never expire
+NO_EXPIRY = 0
+
+
+class RegistryIndex:
+    """
+    Compact, columnar registry of a zone.
+
+    Each registered item is a row spread over parallel columns: its name, its path relative to the zone
+    destination, the id of its rule (rule names are interned), and its ordered and expiry dates as ordinal
+    integers. Paths are hashed for O(1) lookups and expiry dates are kept sorted on demand.
+
+    Rows are only converted to OrderedFile models at the boundaries (plans, the repository API), so a
+    registry of hundreds of thousands of items costs a few columns instead of as many pydantic models.
+    Removed rows are tombstoned until compact() is called.
+    """
+
+    def __init__(self, destination_path: str):
+        self.__destination_prefix = os.path.join(str(destination_path), "")
+
+        # Columns
+        self.__names: List[Optional[str]] = []
+        self.__relative_paths: List[Optional[str]] = []
+        self.__rule_ids = array('I')
+        self.__ordered_ordinals = array('i')
+        self.__expiry_ordinals = array('i')
+        self.__alive = bytearray()
+
+        # Interned rule names
+        self.__rule_names: List[str] = []
+        self.__rule_ids_by_name: Dict[str, int] = {}
+
+        # Relative path -> row
+        self.__rows_by_path: Dict[str, int] = {}
+
+        # Sorted (expiry ordinal, row) keys, built on first use
+        self.__expiry_keys: Optional[List[Tuple[int, int]]] = None
+
+        self.__live_count = 0
+
+    @classmethod
+    def from_ordered_files(cls, destination_path: str, ordered_files: List[OrderedFile]) -> "RegistryIndex":
+        registry_index = cls(destination_path)
+        for item in ordered_files:
+            registry_index.add_ordered_file(item)
+        return registry_index
+
+    def __len__(self) -> int:
+        return self.__live_count
+
+    def add(self, name: str, path: str, rule_name: str, ordered_ordinal: int, expiry_ordinal: int = NO_EXPIRY,
+            replace: bool = True) -> int:
+        """
+        Register an item and return its row.
+
+        :param replace: Remove the item already registered at the same path. Without it (paths known to be
+                        unique, as in the database) both rows would be kept and the path mapped to the new one.
+        """
+        relative_path = self.__to_relative_path(path)
+
+        existing_row = self.__rows_by_path.get(relative_path)
+        if replace and existing_row is not None:
+            self.remove(existing_row)
+
+        rule_id = self.__rule_ids_by_name.get(rule_name)
+        if rule_id is None:
+            rule_id = self.__rule_ids_by_name[rule_name] = len(self.__rule_names)
+            self.__rule_names.append(rule_name)
+
+        row = len(self.__names)
+        self.__names.append(name)
+        self.__relative_paths.append(relative_path)
+        self.__rule_ids.append(rule_id)
+        self.__ordered_ordinals.append(ordered_ordinal)
+        self.__expiry_ordinals.append(expiry_ordinal)
+        self.__alive.append(1)
+        self.__live_count += 1
+
+        self.__rows_by_path[relative_path] = row
+
+        # Rows only grow, so the new key sorts after every key with the same expiry date
+        if self.__expiry_keys is not None and expiry_ordinal != NO_EXPIRY:
+            bisect.insort(self.__expiry_keys, (expiry_ordinal, row))
+
+        return row
+
+    def add_ordered_file(self, item: OrderedFile) -> int:
+        return self.add(item.name, item.path, item.rule_name_applied, item.ordered_date.toordinal(),
+                        item.expiry_date.toordinal() if item.expiry_date else NO_EXPIRY)
+
+    def remove(self, row: int) -> None:
+        if not self.__alive[row]:
+            return
+
+        relative_path = self.__relative_paths[row]
+
+        self.__alive[row] = 0
+        self.__live_count -= 1
+        self.__names[row] = None
+        self.__relative_paths[row] = None
+        self.__expiry_keys = None
+
+        if self.__rows_by_path.get(relative_path) == row:
+            del self.__rows_by_path[relative_path]
+
+    def compact(self) -> None:
+        """ Drop the tombstones once they outnumber the live rows (row numbers change). """
+        if len(self.__names) - self.__live_count <= max(self.__live_count, 1024):
+            return
+
+        live_rows = list(self.rows())
+        rule_names = self.__rule_names
+
+        columns = [(self.__names[row], self.__relative_paths[row], rule_names[self.__rule_ids[row]],
+                    self.__ordered_ordinals[row], self.__expiry_ordinals[row]) for row in live_rows]
+
+        self.__init__(self.__destination_prefix)
+        for name, relative_path, rule_name, ordered_ordinal, expiry_ordinal in columns:
+            self.add(name, relative_path, rule_name, ordered_ordinal, expiry_ordinal)
+
+    def rows(self) -> Iterator[int]:
+        """ Live rows, in registration order. """
+        alive = self.__alive
+        return (row for row in range(len(alive)) if alive[row])
+
+    def find_path(self, path: str) -> Optional[int]:
+        return self.__rows_by_path.get(self.__to_relative_path(path))
+
+    def find_relative_path(self, relative_path: str) -> Optional[int]:
+        return self.__rows_by_path.get(relative_path)
+
+    def get_expired_rows(self, today_ordinal: int) -> List[int]:
+        """ Rows whose expiry date is due, ordered by expiry date. """
+        if self.__expiry_keys is None:
+            expiry_ordinals = self.__expiry_ordinals
+            self.__expiry_keys = sorted((expiry_ordinals[row], row) for row in self.rows()
+                                        if expiry_ordinals[row] != NO_EXPIRY)
+
+        expired_count = bisect.bisect_right(self.__expiry_keys, (today_ordinal, len(self.__names)))
+        return [row for _, row in self.__expiry_keys[:expired_count]]
+
+    def get_name(self, row: int) -> str:
+        return self.__names[row]
+
+    def get_relative_path(self, row: int) -> str:
+        """ Path relative to the zone destination (absolute for items registered outside of it). """
+        return self.__relative_paths[row]
+
+    def get_path(self, row: int) -> str:
+        return os.path.join(self.__destination_prefix, self.__relative_paths[row])
+
+    def get_rule_name(self, row: int) -> str:
+        return self.__rule_names[self.__rule_ids[row]]
+
+    def get_ordered_ordinal(self, row: int) -> int:
+        return self.__ordered_ordinals[row]
+
+    def get_expiry_ordinal(self, row: int) -> int:
+        return self.__expiry_ordinals[row]
+
+    def to_ordered_file(self, row: int) -> OrderedFile:
+        expiry_ordinal = self.__expiry_ordinals[row]
+        return OrderedFile(
+            name=self.__names[row],
+            ordered_date=datetime.date.fromordinal(self.__ordered_ordinals[row]),
+            path=self.get_path(row),
+            rule_name_applied=self.get_rule_name(row),
+            expiry_date=datetime.date.fromordinal(expiry_ordinal) if expiry_ordinal != NO_EXPIRY else None,
+        )
+
+    def to_json(self, row: int) -> dict:
+        """ The row as OrderedFile would serialize it (camelCase keys, ISO dates), without building the model. """
+        expiry_ordinal = self.__expiry_ordinals[row]
+        return {
+            "name": self.__names[row],
+            "orderedDate": datetime.date.fromordinal(self.__ordered_ordinals[row]).isoformat(),
+            "path": self.get_path(row),
+            "ruleNameApplied": self.get_rule_name(row),
+            "expiryDate": datetime.date.fromordinal(expiry_ordinal).isoformat()
+            if expiry_ordinal != NO_EXPIRY else None,
+        }
+
+    def __to_relative_path(self, path: str) -> str:
+        if path.startswith(self.__destination_prefix):
+            return path[len(self.__destination_prefix):]
+        return path
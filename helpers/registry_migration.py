@@ -0,0 +1,45 @@
+from typing import Optional
+
+from models.app_config import RootConfig
+from services.json_config_persister import JsonConfigPersister
+from services.sqlite_database import SqliteDatabase
+
+
+def migrate_ordered_files(root_config: RootConfig, database: SqliteDatabase,
+                          persister: Optional[JsonConfigPersister]) -> int:
+    """
+    Move the 'orderedFiles' arrays of every zone from settings.json into the SQLite registry.
+    Items already present in the database (same zone and path) are skipped, so an interrupted
+    migration can simply run again.
+
+    :param persister: Writes settings.json without the migrated arrays, None leaves the file as it is (plans).
+
+    :return: The number of items migrated.
+    """
+    zones_to_migrate = [zone for zone in root_config.zones if zone.ordered_files]
+    if not zones_to_migrate:
+        return 0
+
+    migrated_count = 0
+
+    # 1. Copy every registry into the database in a single transaction
+    with database.transaction() as connection:
+        for zone in zones_to_migrate:
+            for item in zone.ordered_files:
+                cursor = connection.execute(
+                    "INSERT INTO ordered_files (zone, name, ordered_date, path, rule_name_applied, expiry_date) "
+                    "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                    "(SELECT 1 FROM ordered_files WHERE zone = ? AND path = ?)",
+                    (zone.zone_name, item.name, item.ordered_date.isoformat(), item.path,
+                     item.rule_name_applied, item.expiry_date.isoformat() if item.expiry_date else None,
+                     zone.zone_name, item.path)
+                )
+                migrated_count += cursor.rowcount
+
+    # 2. Leave settings.json with configuration only
+    for zone in zones_to_migrate:
+        zone.ordered_files = []
+    if persister is not None:
+        persister.save()
+
+    return migrated_count
@@ -0,0 +1,249 @@
+import fnmatch
+import functools
+import math
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from helpers.content_sniffer import ContentSniffer
+from models.models import FileConditions, SortingRule
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class _FileBounds(NamedTuple):
+    """ Conditions of a rule in bytes and seconds, a missing bound is open. """
+    min_size: float
+    max_size: float
+    min_age: float
+    max_age: float
+    by_access: bool
+
+    @classmethod
+    def from_conditions(cls, conditions: FileConditions) -> "_FileBounds":
+        def get_bound(value: Optional[float], scale: int, default: float) -> float:
+            return default if value is None else value * scale
+
+        return cls(
+            min_size=get_bound(conditions.min_size_in_mb, 1024 * 1024, 0),
+            max_size=get_bound(conditions.max_size_in_mb, 1024 * 1024, math.inf),
+            min_age=get_bound(conditions.min_age_days, SECONDS_PER_DAY, 0),
+            max_age=get_bound(conditions.max_age_days, SECONDS_PER_DAY, math.inf),
+            by_access=conditions.age_by == 'accessed',
+        )
+
+    def admits(self, file_stat: os.stat_result) -> bool:
+        if not self.min_size <= file_stat.st_size <= self.max_size:
+            return False
+        if self.min_age == 0 and self.max_age == math.inf:
+            return True
+
+        age = time.time() - (file_stat.st_atime if self.by_access else file_stat.st_mtime)
+        return self.min_age <= age <= self.max_age
+
+
+class RuleMatcher:
+    """
+    Compiled view of a zone's sorting rules.
+
+    Built once per zone and shared by the FileSorter and the Auditor. Matching keeps the
+    first-match-wins semantics of the declared rule order:
+    - extension rules are resolved with a single hash lookup,
+    - regex rules are precompiled and only tried while they can still beat the best candidate,
+    - glob rules are translated into one alternation regex whose named groups record the rule,
+    - content rules only read the file's header when no name-based rule declared before them matches,
+    - rules with conditions are checked on the file's stat, a file outside of them goes on to the next
+      rules (tried one by one, only for that file).
+    """
+
+    def __init__(self, sorting_rules: List[SortingRule], cache_size: int = 4096):
+        self.__sorting_rules = sorting_rules
+        self.__cache_size = cache_size
+
+        # Extension (lowercased) -> index of the first rule declaring it
+        self.__extension_index: Dict[str, int] = {}
+
+        # (rule index, compiled patterns) in declaration order
+        self.__regex_rules: List[Tuple[int, List[re.Pattern]]] = []
+
+        # Combined glob alternation; group name -> rule index
+        self.__glob_regex: Optional[re.Pattern] = None
+        self.__glob_groups: Dict[str, int] = {}
+
+        # (rule index, content types) in declaration order
+        self.__content_rules: List[Tuple[int, Set[str]]] = []
+        self.__content_sniffer = ContentSniffer(cache_size)
+
+        # Patterns of each rule on its own (compiled glob for glob rules), to find the rule after a given one
+        self.__rule_patterns: List[object] = []
+
+        # Rule index -> bounds, for rules with conditions
+        self.__file_bounds: Dict[int, _FileBounds] = {}
+
+        # Lookups used by the Auditor
+        self.__rules_by_name: Dict[str, SortingRule] = {}
+        self.__rules_by_destination: Dict[str, SortingRule] = {}
+
+        self.__compile()
+
+        self.__match_name = functools.lru_cache(maxsize=cache_size)(self.__find_name_match)
+
+    def __getstate__(self):
+        # Compiled rules are cached between launches (see ConfigLoader), the match caches are not
+        state = self.__dict__.copy()
+        del state["_RuleMatcher__match_name"]
+        del state["_RuleMatcher__content_sniffer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__match_name = functools.lru_cache(maxsize=self.__cache_size)(self.__find_name_match)
+        self.__content_sniffer = ContentSniffer(self.__cache_size)
+
+    @property
+    def has_age_conditions(self) -> bool:
+        """ Whether a rule matches files by age: the same unchanged file may match another rule later on. """
+        return any(bounds.min_age > 0 or bounds.max_age < math.inf for bounds in self.__file_bounds.values())
+
+    def match(self, item_name: str) -> Optional[SortingRule]:
+        """
+        Find the first name-based rule that matches the given item name (content rules never match folders).
+
+        :param item_name: Name of the file or folder (not the full path).
+        :return: The matching rule, or None if no rule matches.
+        """
+        best_index = self.__match_name(item_name)
+        if best_index < len(self.__sorting_rules):
+            return self.__sorting_rules[best_index]
+        return None
+
+    def match_file(self, file_path: str, file_stat: os.stat_result) -> Optional[SortingRule]:
+        """
+        Find the first rule that matches the given file, by name or by content.
+
+        :param file_path: Path of the file, its header is read only if a content rule can still win.
+        :param file_stat: Stat of the file, the detected type is cached on it and conditions are checked on it.
+        :return: The matching rule, or None if no rule matches.
+        """
+        # 1. Name-based rules
+        best_index = self.__match_name(os.path.basename(file_path))
+
+        # 2. Content rules declared before the best name match
+        if self.__content_rules and self.__content_rules[0][0] < best_index:
+            content_types = self.__content_sniffer.get_types(str(file_path), file_stat)
+            for index, rule_types in self.__content_rules:
+                if index >= best_index:
+                    break
+                if any(content_type in rule_types for content_type in content_types):
+                    best_index = index
+                    break
+
+        # 3. Conditions of the matched rule, a file outside of them goes on to the next rules
+        while best_index in self.__file_bounds and not self.__file_bounds[best_index].admits(file_stat):
+            best_index = self.__find_next_match(file_path, file_stat, best_index + 1)
+
+        if best_index < len(self.__sorting_rules):
+            return self.__sorting_rules[best_index]
+        return None
+
+    def __compile(self):
+        glob_alternatives = []
+
+        for index, rule in enumerate(self.__sorting_rules):
+            self.__rules_by_name.setdefault(rule.rule_name, rule)
+            if rule.destination_folder:
+                self.__rules_by_destination.setdefault(rule.destination_folder, rule)
+            if rule.conditions:
+                self.__file_bounds[index] = _FileBounds.from_conditions(rule.conditions)
+
+            rule_patterns = None
+
+            if rule.match_by == "extension":
+                for pattern in rule.patterns:
+                    self.__extension_index.setdefault(pattern.lower(), index)
+                rule_patterns = {pattern.lower() for pattern in rule.patterns}
+
+            elif rule.match_by == "regex":
+                rule_patterns = [re.compile(pattern) for pattern in rule.patterns]
+                self.__regex_rules.append((index, rule_patterns))
+
+            elif rule.match_by == "content":
+                rule_patterns = {pattern.lower() for pattern in rule.patterns}
+                self.__content_rules.append((index, rule_patterns))
+
+            elif rule.match_by == "glob":
+                translated_patterns = []
+                for pattern_index, pattern in enumerate(rule.patterns):
+                    group_name = f"rule{index}_{pattern_index}"
+                    self.__glob_groups[group_name] = index
+                    translated = fnmatch.translate(os.path.normcase(pattern))
+                    glob_alternatives.append(f"(?P<{group_name}>{translated})")
+                    translated_patterns.append(translated)
+                if translated_patterns:
+                    rule_patterns = re.compile("|".join(translated_patterns))
+
+            self.__rule_patterns.append(rule_patterns)
+
+        if glob_alternatives:
+            self.__glob_regex = re.compile("|".join(glob_alternatives))
+
+    def __find_name_match(self, item_name: str) -> int:
+        """ Index of the first name-based rule matching the item name, len(rules) if none matches. """
+        best_index = len(self.__sorting_rules)
+
+        # 1. Extension index
+        _, extension = os.path.splitext(item_name)
+        extension_index = self.__extension_index.get(extension.lower())
+        if extension_index is not None:
+            best_index = extension_index
+
+        # 2. Glob alternation (leftmost alternative is the earliest rule)
+        if self.__glob_regex is not None:
+            glob_match = self.__glob_regex.match(os.path.normcase(item_name))
+            if glob_match:
+                best_index = min(best_index, self.__glob_groups[glob_match.lastgroup])
+
+        # 3. Regex rules, only while they can still win
+        for index, patterns in self.__regex_rules:
+            if index >= best_index:
+                break
+            if any(pattern.match(item_name) for pattern in patterns):
+                best_index = index
+                break
+
+        return best_index
+
+    def __find_next_match(self, file_path: str, file_stat: os.stat_result, start_index: int) -> int:
+        """ Index of the first rule from start_index matching the file by name or content, len(rules) if none does. """
+        item_name = os.path.basename(file_path)
+
+        for index in range(start_index, len(self.__sorting_rules)):
+            match_by = self.__sorting_rules[index].match_by
+            rule_patterns = self.__rule_patterns[index]
+            if rule_patterns is None:
+                continue
+
+            if match_by == "extension":
+                is_match = os.path.splitext(item_name)[1].lower() in rule_patterns
+            elif match_by == "regex":
+                is_match = any(pattern.match(item_name) for pattern in rule_patterns)
+            elif match_by == "glob":
+                is_match = rule_patterns.match(os.path.normcase(item_name)) is not None
+            else:
+                content_types = self.__content_sniffer.get_types(str(file_path), file_stat)
+                is_match = any(content_type in rule_patterns for content_type in content_types)
+
+            if is_match:
+                return index
+
+        return len(self.__sorting_rules)
+
+    def get_rule_by_name(self, rule_name: str) -> Optional[SortingRule]:
+        return self.__rules_by_name.get(rule_name)
+
+    def get_rule_by_destination(self, destination_folder: str) -> Optional[SortingRule]:
+        return self.__rules_by_destination.get(destination_folder)
+
+    def get_sorting_rules(self) -> List[SortingRule]:
+        return self.__sorting_rules
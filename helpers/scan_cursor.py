@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from models.models import SortingRule
+from services.state_store import StateStore
+
+
+class ScanCursor:
+    """
+    Source items the file sorter left in place (ignored, too large), persisted between runs.
+
+    Each item is kept with the (size, mtime, inode) it had when it was left, so while it does not change
+    it is skipped without being matched again (no pattern checks, no header read for content rules).
+    The cursor is tied to a hash of the zone's rules and size limit: once they change, every item is
+    examined again. A full scan of the source drops the items that are gone.
+    """
+
+    STATE_KEY = "scan_cursor"
+
+    def __init__(self, zone_name: str, state_store: StateStore, rules_hash: str):
+        self.__zone_name = zone_name
+        self.__state_store = state_store
+        self.__rules_hash = rules_hash
+
+        # Item path -> [size, mtime_ns, inode]
+        self.__entries: Optional[Dict[str, list]] = None
+        self.__seen_paths: Set[str] = set()
+        self.__is_dirty = False
+
+    @staticmethod
+    def get_rules_hash(sorting_rules: List[SortingRule], max_size_in_mb: int) -> str:
+        """ Hash of everything that decides whether an item is left in place. """
+        rules_document = [rule.model_dump(mode='json') for rule in sorting_rules]
+        rules_bytes = json.dumps([rules_document, max_size_in_mb], sort_keys=True).encode('utf-8')
+        return hashlib.sha256(rules_bytes).hexdigest()
+
+    def is_unchanged(self, item_path: Path, item_stat: os.stat_result) -> bool:
+        """ Whether the item was left in place by an earlier run and has not changed since. """
+        self.__load()
+
+        key = str(item_path)
+        entry = self.__entries.get(key)
+        if entry is None:
+            return False
+
+        if entry != self.__get_signature(item_stat):
+            del self.__entries[key]
+            self.__is_dirty = True
+            return False
+
+        self.__seen_paths.add(key)
+        return True
+
+    def record(self, item_path: Path, item_stat: os.stat_result) -> None:
+        """ Remember an item left in place. """
+        self.__load()
+
+        key = str(item_path)
+        signature = self.__get_signature(item_stat)
+        self.__seen_paths.add(key)
+        if self.__entries.get(key) != signature:
+            self.__entries[key] = signature
+            self.__is_dirty = True
+
+    def save(self, is_full_scan: bool) -> None:
+        """
+        Persist the cursor.
+
+        :param is_full_scan: The whole source was listed: the items not seen since the last save are gone.
+        """
+        if self.__entries is None:
+            return
+
+        if is_full_scan:
+            stale_paths = self.__entries.keys() - self.__seen_paths
+            for stale_path in stale_paths:
+                del self.__entries[stale_path]
+            self.__is_dirty = self.__is_dirty or bool(stale_paths)
+            self.__seen_paths = set()
+
+        if not self.__is_dirty:
+            return
+
+        self.__state_store.save(self.__zone_name, self.STATE_KEY,
+                                {"rulesHash": self.__rules_hash, "items": self.__entries})
+        self.__is_dirty = False
+
+    def __load(self) -> None:
+        if self.__entries is not None:
+            return
+
+        state = self.__state_store.load(self.__zone_name, self.STATE_KEY) or {}
+        if state.get("rulesHash") == self.__rules_hash:
+            self.__entries = state.get("items", {})
+        else:
+            # The rules changed: an item left in place may be sorted now
+            self.__entries = {}
+            self.__is_dirty = bool(state)
+
+    @staticmethod
+    def __get_signature(item_stat: os.stat_result) -> list:
+        return [item_stat.st_size, item_stat.st_mtime_ns, item_stat.st_ino]
@@ -0,0 +1,277 @@
+import errno
+import itertools
+import multiprocessing
+import os
+import pathlib
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from helpers.file_classifier import FileClassifier
+from models.plan import PlannedMove
+
+
+def walk_files(folder_path: pathlib.Path) -> Iterator[Tuple[pathlib.Path, os.stat_result]]:
+    """
+    Every file under the folder with its stat, in the same order as rglob('*').
+    Like rglob, symlinked folders are not descended into, and symlinked files are followed.
+    """
+    sub_folders = []
+
+    try:
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                try:
+                    # The entry type comes from the directory listing, only the size needs a stat
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            sub_folders.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    entry_stat = entry.stat()
+                except OSError:
+                    continue
+
+                yield pathlib.Path(entry.path), entry_stat
+    except OSError as e:
+        print(f"Error listing folder {folder_path}: {e}")
+        return
+
+    for sub_folder in sub_folders:
+        yield from walk_files(pathlib.Path(sub_folder))
+
+
+class Shard(NamedTuple):
+    folder_path: str
+    # Only these files of the folder and none of its subfolders (a folder split into several shards),
+    # None for the whole subtree
+    file_names: Optional[Tuple[str, ...]] = None
+
+
+class ShardResult(NamedTuple):
+    """
+    What a worker did with the files of a shard. Files are sent back as (source path, rule name) pairs,
+    a fraction of the cost of pickling their moves, which the parent builds again from the rule.
+    """
+    scanned_count: int
+    rule_match_counts: Dict[str, int]
+    # Files the worker moved, registered by the parent
+    moved: List[Tuple[str, str]]
+    # Files left to the parent: their destination was taken or on another device, or the run is a plan
+    pending: List[Tuple[str, str]]
+    # Files of rules with deduplication, compared with the destination by the parent (with their size)
+    duplicate_candidates: List[Tuple[str, str, int]]
+    # Files still being written, left in place, and the seconds until the first of them settles
+    unsettled_count: int
+    settle_delay: Optional[float]
+
+
+# State of a worker process, set once when it starts
+_worker_classifier: Optional[FileClassifier] = None
+_worker_known_folders: Set[str] = set()
+
+
+def _init_worker(file_classifier: FileClassifier, is_output_redirected: bool) -> None:
+    global _worker_classifier
+    _worker_classifier = file_classifier
+
+    # Messages follow the parent's output, which --plan sends to stderr
+    if is_output_redirected:
+        sys.stdout = sys.stderr
+
+
+def _list_shard_files(shard: Shard) -> Iterator[Tuple[pathlib.Path, os.stat_result]]:
+    if shard.file_names is None:
+        yield from walk_files(pathlib.Path(shard.folder_path))
+        return
+
+    for file_name in shard.file_names:
+        file_path = os.path.join(shard.folder_path, file_name)
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            continue
+        yield pathlib.Path(file_path), file_stat
+
+
+def _move_without_replacing(planned_move: PlannedMove) -> bool:
+    """
+    Move a file unless its destination is taken: of two workers moving a file with the same name into
+    the same folder only one gets it, and a file already in the destination is never replaced by a worker.
+
+    The file is hard linked into place and unlinked from the source, as link() fails when the destination
+    exists. On filesystems without hard links, the destination is claimed by creating it empty with O_EXCL,
+    then replaced with a rename.
+
+    :return: False when the move is left to the parent (destination taken, another device, any error).
+    """
+    source_path = planned_move.source_path
+    destination_path = planned_move.destination_path
+    destination_folder = str(destination_path.parent)
+
+    try:
+        if destination_folder not in _worker_known_folders:
+            os.makedirs(destination_folder, exist_ok=True)
+            _worker_known_folders.add(destination_folder)
+        os.link(source_path, destination_path, follow_symlinks=False)
+    except FileExistsError:
+        return False
+    except (OSError, NotImplementedError) as e:
+        # Across devices the parent copies the file with its journaled mover
+        if isinstance(e, OSError) and e.errno == errno.EXDEV:
+            return False
+        return _claim_and_replace(source_path, destination_path)
+
+    try:
+        os.unlink(source_path)
+    except OSError:
+        _remove_quietly(destination_path)
+        return False
+    return True
+
+
+def _claim_and_replace(source_path: pathlib.Path, destination_path: pathlib.Path) -> bool:
+    try:
+        claim_descriptor = os.open(destination_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        return False
+    os.close(claim_descriptor)
+
+    try:
+        os.replace(source_path, destination_path)
+    except OSError:
+        _remove_quietly(destination_path)
+        return False
+    return True
+
+
+def _remove_quietly(path: pathlib.Path) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _sort_shard(shard: Shard, move_files: bool) -> ShardResult:
+    scanned_count = 0
+    rule_match_counts: Counter = Counter()
+    moved: List[Tuple[str, str]] = []
+    pending: List[Tuple[str, str]] = []
+    duplicate_candidates: List[Tuple[str, str, int]] = []
+    unsettled_count = 0
+    settle_delay: Optional[float] = None
+
+    for file_path, file_stat in _list_shard_files(shard):
+        scanned_count += 1
+
+        file_settle_delay = _worker_classifier.get_settle_delay(file_stat)
+        if file_settle_delay > 0:
+            unsettled_count += 1
+            settle_delay = file_settle_delay if settle_delay is None else min(settle_delay, file_settle_delay)
+            continue
+
+        item_rule, planned_move = _worker_classifier.classify(file_path, file_stat)
+        if item_rule:
+            rule_match_counts[item_rule.rule_name] += 1
+        if planned_move is None:
+            continue
+
+        if item_rule.deduplication and item_rule.deduplication.enabled:
+            duplicate_candidates.append((str(file_path), item_rule.rule_name, file_stat.st_size))
+        elif move_files and _move_without_replacing(planned_move):
+            moved.append((str(file_path), item_rule.rule_name))
+        else:
+            pending.append((str(file_path), item_rule.rule_name))
+
+    return ShardResult(scanned_count, dict(rule_match_counts), moved, pending, duplicate_candidates,
+                       unsettled_count, settle_delay)
+
+
+class ShardPool:
+    """
+    Sorts the files of large 'process_contents' folders on a pool of processes.
+
+    A folder is split into shards, one per top-level subfolder, and its own files in chunks of FILES_PER_SHARD.
+    While there are fewer shards than workers, the subfolders are split again, up to MAX_SPLIT_DEPTH levels.
+    Each worker walks its shard, classifies the files and moves them within the filesystem. The moved files come back
+    to the parent in shard order (the order of the sequential walk), to be registered in a single commit.
+
+    The processes are started on the first sharded folder and reused until close().
+    """
+
+    FILES_PER_SHARD = 2000
+    MAX_SPLIT_DEPTH = 3
+
+    # Shards per worker, so a large shard does not leave the other workers idle
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, file_classifier: FileClassifier, max_workers: int):
+        self.__file_classifier = file_classifier
+        self.__max_workers = max_workers
+        self.__process_pool: Optional[ProcessPoolExecutor] = None
+
+    def split(self, folder_path: pathlib.Path) -> List[Shard]:
+        """ The shards of a folder, in the order the sequential walk would reach their files. """
+        shards = [Shard(str(folder_path))]
+
+        for _ in range(self.MAX_SPLIT_DEPTH):
+            if len(shards) >= self.__max_workers * self.SHARDS_PER_WORKER:
+                break
+
+            split_shards = []
+            for shard in shards:
+                if shard.file_names is None:
+                    split_shards.extend(self.__split_folder(shard.folder_path))
+                else:
+                    split_shards.append(shard)
+
+            if split_shards == shards:
+                break
+            shards = split_shards
+
+        return shards
+
+    def sort(self, shards: List[Shard], move_files: bool = True) -> Iterator[ShardResult]:
+        """
+        :param move_files: Let the workers move the files, else every move is returned as pending (plans).
+        :return: The result of each shard, in order, as soon as it is available.
+        """
+        if self.__process_pool is None:
+            # Spawned, not forked: the parent runs threads (moves, notifications, other zones)
+            self.__process_pool = ProcessPoolExecutor(
+                max_workers=self.__max_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.__file_classifier, sys.stdout is sys.stderr))
+
+        return self.__process_pool.map(_sort_shard, shards, itertools.repeat(move_files))
+
+    def close(self) -> None:
+        if self.__process_pool is not None:
+            self.__process_pool.shutdown()
+            self.__process_pool = None
+
+    def __split_folder(self, folder_path: str) -> List[Shard]:
+        """ The folder's own files, in chunks, then one shard per subfolder. """
+        file_names = []
+        sub_folders = []
+
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                sub_folders.append(entry.path)
+                        elif entry.is_file():
+                            file_names.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error listing folder {folder_path}: {e}")
+            return []
+
+        shards = [Shard(folder_path, tuple(file_names[start:start + self.FILES_PER_SHARD]))
+                  for start in range(0, len(file_names), self.FILES_PER_SHARD)]
+        shards.extend(Shard(sub_folder) for sub_folder in sub_folders)
+        return shards
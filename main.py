@@ -1,45 +1,190 @@
+import argparse
+import contextlib
+import datetime
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+from typing import List
+
 from models.app_config import ZoneConfig, RootConfig
-from file_sorter import FileSorter
-from helpers.config_loader import load_config
-from helpers.directory_creator import DirectoryCreator
-from registry_checker import Auditor
+from models.plan import Plan
+from helpers.config_loader import ConfigLoader
+from helpers.directory_watcher import create_directory_watcher
+from helpers.registry_migration import migrate_ordered_files
 from services.json_config_persister import JsonConfigPersister
-from services.notification_service import PlyerNotificationService
-from services.ordered_files_repository import ConfigOrderedFilesRepository
-from services.path_repository import ConfigPathRepository
-from services.settings_repository import ConfigSettingsRepository
+from services.metrics_recorder import InMemoryMetricsRecorder, MetricsRecorder, NullMetricsRecorder
+from services.notification_service import (
+    LoggingNotificationService,
+    NotificationService,
+    NullNotificationService,
+    PlyerNotificationService,
+    QueuedNotificationService,
+)
+from services.sqlite_database import SqliteDatabase
+from services.state_store import JsonStateStore
+from zone_pipeline import ZonePipeline
+from zone_runner import ZoneRunner
+from zone_watcher import ZoneWatcher
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rule-based file organization engine.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of zones processed concurrently (default: 1). "
+                             "Zones with overlapping paths always run one after another.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and sort new items as soon as they land in a source path.")
+    parser.add_argument("--poll", action="store_true",
+                        help="In watch mode, poll the source paths instead of using inotify.")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between two scans when polling (default: 2).")
+    parser.add_argument("--audit-interval", type=float, default=3600.0,
+                        help="In watch mode, seconds between two lifecycle audits (default: 3600).")
+    parser.add_argument("--plan", nargs="?", const="-", metavar="FILE",
+                        help="Only compute what a run would do and write it as JSON to FILE (default: stdout). "
+                             "Nothing is moved, deleted or registered.")
+    parser.add_argument("--apply-plan", metavar="FILE",
+                        help="Execute a plan written by --plan, grouping the moves by destination folder.")
+    parser.add_argument("--zone", action="append", metavar="NAME", dest="zones",
+                        help="Only process this zone (repeat the option for several zones). "
+                             "The registries of the other zones are not loaded.")
+    return parser.parse_args()
+
+
+def write_plan(pipelines: List[ZonePipeline], output_path: str) -> None:
+    # Messages printed while planning must not end up in the JSON document
+    with contextlib.redirect_stdout(sys.stderr):
+        zone_plans = []
+        for pipeline in pipelines:
+            try:
+                zone_plans.append(pipeline.plan())
+            except Exception as e:
+                print(f"Error planning zone {pipeline.zone_name}: {e}")
+
+    plan_json = Plan(created_at=datetime.datetime.now(), zones=tuple(zone_plans)).model_dump_json(indent=4, by_alias=True)
+
+    if output_path == "-":
+        print(plan_json)
+    else:
+        Path(output_path).write_text(plan_json, encoding='utf-8')
+
+
+def apply_plan(pipelines: List[ZonePipeline], plan_path: str, jobs: int) -> None:
+    try:
+        plan = Plan.model_validate_json(Path(plan_path).read_text(encoding='utf-8'))
+    except Exception as e:
+        print(f"Error loading plan: {e}")
+        return
+
+    zone_plans = {zone_plan.zone_name: zone_plan for zone_plan in plan.zones}
+    planned_pipelines = [pipeline for pipeline in pipelines if pipeline.zone_name in zone_plans]
+
+    ZoneRunner(planned_pipelines, jobs).run(
+        lambda pipeline: pipeline.execute_plan(zone_plans[pipeline.zone_name]))
+
+
+def create_notification_service(root_config: RootConfig) -> NotificationService:
+    notification_config = root_config.notifications
+
+    if notification_config.backend == 'none':
+        return NullNotificationService()
+
+    backend = LoggingNotificationService() if notification_config.backend == 'log' else PlyerNotificationService()
+
+    # Delivered from a background thread, one summary per batch window
+    return QueuedNotificationService(backend, notification_config.batch_seconds,
+                                     notification_config.min_interval_seconds)
+
+
+def create_metrics_recorder(root_config: RootConfig) -> MetricsRecorder:
+    metrics_config = root_config.metrics
+
+    if not metrics_config.enabled:
+        return NullMetricsRecorder()
+
+    return InMemoryMetricsRecorder(metrics_config.json_lines_path, metrics_config.prometheus_path)
 
 
 def main():
+    arguments = parse_arguments()
     json_path = "data/settings.json"
 
+    start_time = time.perf_counter()
+
+    # Validated configuration and compiled rules are cached until settings.json changes
+    config_loader = ConfigLoader(json_path, Path(json_path).with_name("state") / "config.cache")
     try:
-        root_config: RootConfig = load_config(json_path)
+        root_config: RootConfig = config_loader.load(arguments.zones)
     except Exception as e:
         print(f"Error loading configuration: {e}")
         return
 
-    global_persister = JsonConfigPersister(json_path, root_config)
-    notification_service = PlyerNotificationService()
+    zone_names = [zone_config.zone_name for zone_config in root_config.zones]
+    unknown_zone_names = [zone_name for zone_name in arguments.zones or [] if zone_name not in zone_names]
+    if unknown_zone_names:
+        print(f"Error: unknown zones {', '.join(unknown_zone_names)} (available: {', '.join(zone_names)})")
+        return
+
+    metrics_recorder = create_metrics_recorder(root_config)
+    metrics_recorder.observe("phase_seconds", time.perf_counter() - start_time, phase="config_load")
+
+    global_persister = JsonConfigPersister(json_path, root_config, metrics_recorder, config_loader)
+    notification_service = create_notification_service(root_config)
+
+    # Registry backend
+    database = None
+    if root_config.registry.backend == 'sqlite':
+        database_path = root_config.registry.database_path or Path(json_path).with_name("registry.db")
+        # A plan registers nothing: it reads an in-memory copy of the registry, migrated there only
+        database = SqliteDatabase(database_path, in_memory=bool(arguments.plan))
+
+        migrated_count = migrate_ordered_files(root_config, database,
+                                               None if arguments.plan else global_persister)
+        if migrated_count and not arguments.plan:
+            # On stderr, so it never ends up in a plan written to stdout
+            print(f"Migrated {migrated_count} ordered files from {json_path} to {database_path}", file=sys.stderr)
+
+    # Working state kept between runs (snapshots, caches)
+    state_store = JsonStateStore(Path(json_path).with_name("state"), metrics_recorder)
+
+    # No zone may sort away the destination of another one
+    destination_paths = [zone_config.paths.destination_path for zone_config in root_config.zones]
+
+    selected_zones = [zone_config for zone_config in root_config.zones
+                      if not arguments.zones or zone_config.zone_name in arguments.zones]
+
+    pipelines = [ZonePipeline(zone_config, global_persister, database, notification_service, state_store,
+                              destination_paths, metrics_recorder, config_loader.get_rule_matcher(zone_config.zone_name))
+                 for zone_config in selected_zones]
 
-    for zone_config in root_config.zones:
-        path_repository = ConfigPathRepository(zone_config.paths)
-        settings_repository = ConfigSettingsRepository(zone_config)
-        ordered_files_repository = ConfigOrderedFilesRepository(zone_config, global_persister)
+    if arguments.plan:
+        write_plan(pipelines, arguments.plan)
+    elif arguments.apply_plan:
+        with global_persister.deferred():
+            apply_plan(pipelines, arguments.apply_plan, arguments.jobs)
+    elif arguments.watch:
+        directory_watcher = create_directory_watcher(arguments.poll, arguments.poll_interval)
+        ZoneWatcher(pipelines, directory_watcher, global_persister,
+                    audit_interval=arguments.audit_interval, jobs=arguments.jobs,
+                    metrics_recorder=metrics_recorder).run()
+    else:
+        # Every registry change of the run is flushed to settings.json at most once, at the end
+        with global_persister.deferred():
+            ZoneRunner(pipelines, arguments.jobs).run()
 
-        # 1. Create the directories if they do not exist
-        directory_creator = DirectoryCreator(path_repository, settings_repository)
-        directory_creator.execute()
+    # Pending notifications are delivered as a single summary
+    with metrics_recorder.timer("phase_seconds", phase="notifications"):
+        notification_service.close()
 
-        # 2. Check the files
-        auditor = Auditor(path_repository, ordered_files_repository, settings_repository, notification_service)
-        auditor.check_files()
+    if database:
+        database.close()
 
-        # 3. Sort the files
-        file_organizer = FileSorter(path_repository, settings_repository, ordered_files_repository,
-                                    notification_service)
-        file_organizer.sort()
+    metrics_recorder.observe("phase_seconds", time.perf_counter() - start_time, phase="total")
+    metrics_recorder.export()
 
 
 if __name__ == "__main__":
+    # Shard workers are spawned: a frozen build must run them instead of main()
+    multiprocessing.freeze_support()
     main()
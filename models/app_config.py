@@ -6,7 +6,7 @@ from models.base import CamelCaseModel
 from models.models import (
     GlobalSettings,
     OrderedFile,
-    PathConfig, SortingRule,
+    MetricsConfig, NotificationConfig, PathConfig, RegistryConfig, SortingRule,
 )
 
 
@@ -23,7 +23,7 @@ class ZoneConfig(CamelCaseModel):
     # --- Sorting rules ---
     rules: List[SortingRule]
 
-    # --- Register of ordered files ---
+    # --- Register of ordered files (only used by the 'json' registry backend) ---
     ordered_files: List[OrderedFile] = []
 
 class RootConfig(CamelCaseModel):
@@ -31,3 +31,9 @@ class RootConfig(CamelCaseModel):
     Represents the root configuration containing multiple zone configurations.
     """
     zones: List[ZoneConfig] = []
+
+    registry: RegistryConfig = RegistryConfig()
+
+    notifications: NotificationConfig = NotificationConfig()
+
+    metrics: MetricsConfig = MetricsConfig()
@@ -0,0 +1,46 @@
+from typing import List, Tuple
+
+# (type, offset, magic bytes), checked in order: the first signature found decides the type
+SIGNATURES: List[Tuple[str, int, bytes]] = [
+    ("pdf", 0, b"%PDF-"),
+    ("png", 0, b"\x89PNG\r\n\x1a\n"),
+    ("jpg", 0, b"\xff\xd8\xff"),
+    ("gif", 0, b"GIF87a"),
+    ("gif", 0, b"GIF89a"),
+    ("tiff", 0, b"II*\x00"),
+    ("tiff", 0, b"MM\x00*"),
+    ("bmp", 0, b"BM"),
+    ("psd", 0, b"8BPS"),
+    ("zip", 0, b"PK\x03\x04"),
+    ("zip", 0, b"PK\x05\x06"),
+    ("rar", 0, b"Rar!\x1a\x07"),
+    ("7z", 0, b"7z\xbc\xaf\x27\x1c"),
+    ("gz", 0, b"\x1f\x8b"),
+    ("bz2", 0, b"BZh"),
+    ("xz", 0, b"\xfd7zXZ\x00"),
+    ("tar", 257, b"ustar"),
+    ("ole", 0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),
+    ("rtf", 0, b"{\\rtf"),
+    ("exe", 0, b"MZ"),
+    ("elf", 0, b"\x7fELF"),
+    ("sqlite", 0, b"SQLite format 3\x00"),
+    ("mkv", 0, b"\x1a\x45\xdf\xa3"),
+    ("riff", 0, b"RIFF"),
+    ("mp4", 4, b"ftyp"),
+    ("mp3", 0, b"ID3"),
+    ("mp3", 0, b"\xff\xfb"),
+    ("mp3", 0, b"\xff\xf3"),
+    ("mp3", 0, b"\xff\xf2"),
+    ("flac", 0, b"fLaC"),
+    ("ogg", 0, b"OggS"),
+]
+
+# Containers whose actual format is told apart by a marker further in the header
+ZIP_MARKERS = [("epub", b"mimetypeapplication/epub+zip"), ("docx", b"word/"), ("xlsx", b"xl/"), ("pptx", b"ppt/"),
+               ("apk", b"AndroidManifest.xml"), ("jar", b"META-INF/MANIFEST.MF")]
+RIFF_FORMATS = {b"WEBP": "webp", b"WAVE": "wav", b"AVI ": "avi"}
+FTYP_BRANDS = {b"qt  ": "mov", b"heic": "heic", b"heix": "heic", b"mif1": "heic", b"M4A ": "m4a"}
+
+# Every type name a 'content' rule may declare
+CONTENT_TYPES = ({name for name, _, _ in SIGNATURES} | {name for name, _ in ZIP_MARKERS}
+                 | set(RIFF_FORMATS.values()) | set(FTYP_BRANDS.values()) | {"webm"})
@@ -2,14 +2,30 @@ import datetime
 from pathlib import Path
 from typing import Literal, Optional
 
-from pydantic import field_validator
+from pydantic import Field, field_validator, model_validator
 
 from models.base import CamelCaseModel
+from models.content_types import CONTENT_TYPES
 
 
 class GlobalSettings(CamelCaseModel):
     max_size_in_mb: int
 
+    # Number of moves the file sorter runs at the same time
+    max_concurrent_moves: int = Field(default=1, ge=1)
+
+    # Processes sharing the files of a large 'process_contents' folder (1 walks it on the main thread)
+    process_contents_workers: int = Field(default=1, ge=1)
+
+    # Keep the folders known to exist between runs, instead of checking them again on every run
+    persist_directory_cache: bool = False
+
+    # Files modified less than this many seconds ago are still being written, they are left for a later run
+    settle_seconds: float = Field(default=0, ge=0)
+
+    # Expired 'delete' items are held this many days in the destination's holding area before being purged
+    soft_delete_days: int = Field(default=0, ge=0)
+
     def convert_mb_to_bytes(cls, data: int) -> int:
         return data * 1024 * 1024
 
@@ -19,6 +35,46 @@ class LifecyclePolicy(CamelCaseModel):
     action: Literal['trash', 'delete'] = 'trash'
     days_to_keep: int = 30
 
+    def get_expiry_date(self, ordered_date: datetime.date) -> Optional[datetime.date]:
+        """ First day on which an item ordered on the given date is due, None if it never expires. """
+        if not self.enabled:
+            return None
+        # Items are removed once more than days_to_keep days have passed
+        return ordered_date + datetime.timedelta(days=self.days_to_keep + 1)
+
+
+class DeduplicationPolicy(CamelCaseModel):
+    """
+    What to do with a matched file whose content is already in the rule's destination folder.
+    'skip' leaves it in the source, 'hardlink' links the destination to the existing copy and removes
+    the source, 'trash' sends it to the trash.
+    """
+    enabled: bool = True
+    action: Literal['skip', 'hardlink', 'trash'] = 'skip'
+
+
+class FileConditions(CamelCaseModel):
+    """
+    Size and age a file must have for the rule to match it, checked on the stat taken while listing its folder.
+    A file outside of them goes on to the next rules. Ages are counted in days since the file was last
+    modified ('modified') or read ('accessed').
+    """
+    min_size_in_mb: Optional[float] = Field(default=None, ge=0)
+    max_size_in_mb: Optional[float] = Field(default=None, ge=0)
+    min_age_days: Optional[float] = Field(default=None, ge=0)
+    max_age_days: Optional[float] = Field(default=None, ge=0)
+    age_by: Literal['modified', 'accessed'] = 'modified'
+
+    @model_validator(mode='after')
+    def validate_ranges(self):
+        if self.min_size_in_mb is not None and self.max_size_in_mb is not None \
+                and self.min_size_in_mb > self.max_size_in_mb:
+            raise ValueError('minSizeInMb cannot be greater than maxSizeInMb')
+        if self.min_age_days is not None and self.max_age_days is not None \
+                and self.min_age_days > self.max_age_days:
+            raise ValueError('minAgeDays cannot be greater than maxAgeDays')
+        return self
+
 
 class OrderedFile(CamelCaseModel):
     name: str
@@ -27,6 +83,9 @@ class OrderedFile(CamelCaseModel):
 
     rule_name_applied: str
 
+    # Computed when the item is registered from the lifecycle policy of the applied rule
+    expiry_date: Optional[datetime.date] = None
+
 
 class PathConfig(CamelCaseModel):
     source_path: Path
@@ -44,13 +103,66 @@ class PathConfig(CamelCaseModel):
             raise ValueError('Destination path cannot be empty')
         return v
 
+class RegistryConfig(CamelCaseModel):
+    """
+    Where the ordered files registry is stored.
+    'json' keeps it inside settings.json, 'sqlite' uses an indexed database file.
+    """
+    backend: Literal['json', 'sqlite'] = 'sqlite'
+    database_path: Optional[Path] = None
+
+
+class NotificationConfig(CamelCaseModel):
+    """
+    How notifications are delivered.
+    'desktop' shows them with plyer, 'log' prints them (headless servers), 'none' drops them.
+    """
+    backend: Literal['desktop', 'log', 'none'] = 'desktop'
+
+    # Messages received within this window are merged into one summary
+    batch_seconds: float = Field(default=5.0, ge=0)
+
+    # Minimum time between two notifications
+    min_interval_seconds: float = Field(default=30.0, ge=0)
+
+
+class MetricsConfig(CamelCaseModel):
+    """
+    Where run metrics (phase timings, counters, operation durations) are exported.
+    Metrics are only recorded when at least one output is set.
+    """
+    # Appended with one JSON object per metric and export
+    json_lines_path: Optional[Path] = None
+
+    # Replaced on every export, in the Prometheus text format (node exporter textfile collector)
+    prometheus_path: Optional[Path] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.json_lines_path is not None or self.prometheus_path is not None
+
+
 class SortingRule(CamelCaseModel):
     rule_name: str
     patterns: list[str]
     lifecycle: Optional[LifecyclePolicy] = None
     destination_folder: Optional[str] = None
-    match_by: Literal['extension', 'regex', 'glob']
+    match_by: Literal['extension', 'regex', 'glob', 'content']
     handlingStrategy: Literal['process_contents', 'move', 'ignore'] = 'move'
 
+    # Compare the content of matched files with the destination folder before moving them
+    deduplication: Optional[DeduplicationPolicy] = None
+
+    # Only match files within these sizes and ages (folders are matched by name alone)
+    conditions: Optional[FileConditions] = None
+
     """Defines """
     delete_empty_after_processing: bool = False
+
+    @model_validator(mode='after')
+    def validate_content_patterns(self):
+        if self.match_by == 'content':
+            unknown_types = [pattern for pattern in self.patterns if pattern.lower() not in CONTENT_TYPES]
+            if unknown_types:
+                raise ValueError(f"Unknown content types {unknown_types}, expected some of {sorted(CONTENT_TYPES)}")
+        return self
@@ -0,0 +1,66 @@
+import datetime
+from pathlib import Path
+from typing import Literal, Optional, Tuple
+
+from pydantic import ConfigDict
+
+from models.base import CamelCaseModel
+from models.models import OrderedFile
+
+
+class PlanModel(CamelCaseModel):
+    """ Plans are computed once and never modified, only executed. """
+    model_config = ConfigDict(frozen=True)
+
+
+class PlannedMove(PlanModel):
+    source_path: Path
+    destination_path: Path
+    rule_name: str
+
+    # Registry entry recorded once the move succeeds (None when the rule has no active lifecycle)
+    ordered_file: Optional[OrderedFile] = None
+
+    # Set when the file has the same content as this path: the rule's deduplication action replaces the move
+    duplicate_of: Optional[Path] = None
+    duplicate_action: Optional[Literal['skip', 'hardlink', 'trash']] = None
+
+
+class PlannedDeletion(PlanModel):
+    """ A registered item whose lifecycle expired. """
+    ordered_file: OrderedFile
+    action: Literal['trash', 'delete']
+
+
+class SortPlan(PlanModel):
+    moves: Tuple[PlannedMove, ...] = ()
+
+    # 'process_contents' folders sent to the trash once their files are moved
+    folders_to_trash: Tuple[Path, ...] = ()
+
+
+class AuditPlan(PlanModel):
+    deletions: Tuple[PlannedDeletion, ...] = ()
+
+    # Items found in the destination that are not registered yet
+    registrations: Tuple[OrderedFile, ...] = ()
+
+    # Registered items that no longer exist
+    unregistrations: Tuple[OrderedFile, ...] = ()
+
+    # Registered items whose expiry date changed with the lifecycle policies
+    expiry_updates: Tuple[OrderedFile, ...] = ()
+
+    # Lifecycle settings the expiry dates were computed with, stored once the plan is executed
+    lifecycle_signature: Optional[str] = None
+
+
+class ZonePlan(PlanModel):
+    zone_name: str
+    audit: AuditPlan
+    sort: SortPlan
+
+
+class Plan(PlanModel):
+    created_at: datetime.datetime
+    zones: Tuple[ZonePlan, ...] = ()
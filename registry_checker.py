@@ -1,40 +1,52 @@
-import glob
+import hashlib
+import json
 import os
-import shutil
-from datetime import datetime
-from pathlib import Path
-from typing import List
-
-from send2trash import send2trash
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
 
+from helpers.deletion_executor import DeletionExecutor
+from helpers.destination_snapshot import DestinationSnapshot, ENTRY_DIRECTORY, ENTRY_FILE, ROOT_DIRECTORY
+from helpers.registry_index import NO_EXPIRY, RegistryIndex
+from helpers.rule_matcher import RuleMatcher
 from models.models import OrderedFile, SortingRule
+from models.plan import AuditPlan, PlannedDeletion
 from services.ordered_files_repository import OrderedFilesRepository
 from services.path_repository import PathRepository
 from services.settings_repository import SettingsRepository
+from services.metrics_recorder import MetricsRecorder
 from services.notification_service import NotificationService
+from services.state_store import StateStore
 
 
 class Auditor:
+    # Hash of the lifecycle settings the registered expiry dates were computed with
+    LIFECYCLE_SIGNATURE_KEY = "lifecycle_signature"
+
+    # Bumped to compute every registered item again once (version 2 repairs the items registered under
+    # their destination folder instead of their rule name)
+    LIFECYCLE_SIGNATURE_VERSION = 2
+
     def __init__(self, path_repository: PathRepository,
                  ordered_files_repository: OrderedFilesRepository,
                  settings_repository: SettingsRepository,
-                 notificator_service: NotificationService):
+                 notificator_service: NotificationService,
+                 rule_matcher: RuleMatcher,
+                 destination_snapshot: DestinationSnapshot,
+                 state_store: StateStore,
+                 deletion_executor: DeletionExecutor,
+                 metrics_recorder: MetricsRecorder):
         self.__path_repository = path_repository
         self.__ordered_files_repository = ordered_files_repository
         self.__settings_repository = settings_repository
         self.__notification_service = notificator_service
+        self.__rule_matcher = rule_matcher
+        self.__destination_snapshot = destination_snapshot
+        self.__state_store = state_store
+        self.__deletion_executor = deletion_executor
+        self.__metrics_recorder = metrics_recorder
+        self.__zone_name = settings_repository.get_app_config().zone_name
 
-        self.__build_policy_map()
-
-    def __build_policy_map(self):
-        """Create a mapping of rule names to their lifecycle policies."""
-        self.__sorting_rules: List[SortingRule] = []
-
-        config = self.__settings_repository.get_app_config()
-
-        # 1. Load policy rules of files
-        for rule in config.rules:
-            self.__sorting_rules.append(rule)
+        self.__sorting_rules: List[SortingRule] = rule_matcher.get_sorting_rules()
 
     def check_files(self):
         """"
@@ -43,97 +55,247 @@ class Auditor:
         2. Register the files which are not registered in the database
         3. Send notification
         """
+        with self.__metrics_recorder.timer("operation_seconds", operation="audit_scan"):
+            audit_plan = self.plan()
+
+        self.execute_plan(audit_plan)
+
+        # Only remember the tree once the registry reflects it
+        self.__destination_snapshot.save()
+
+    def plan(self) -> AuditPlan:
+        """
+        Decide what the audit would do, without touching the filesystem or the registry.
+
+        :return: The deletions and registry changes, to be applied by execute_plan().
+        """
 
         # Paths
         destination_path = self.__path_repository.get_destination_path()
+        today = datetime.now().date()
 
-        items_deleted_count = 0
-        items_to_remote_from_registry: List[OrderedFile] = []
-        all_registered_items = self.__ordered_files_repository.get_ordered_files()
+        # Compact view of the registry: rows only become OrderedFile models when they end up in the plan
+        registry_index = self.__ordered_files_repository.get_registry_index()
+
+        # Expiry dates follow the lifecycle policies: recompute them when a policy changed
+        lifecycle_signature, expiry_updates = self.__plan_expiry_updates(registry_index)
 
-        # Create a map of registered paths for quick lookup
-        registered_paths_map = {item.path: item for item in all_registered_items}
+        # Listing of the destination tree: only directories changed since the last run are read again
+        listings = self.__destination_snapshot.refresh()
+        listings_by_path = self.__index_listings_by_path(str(destination_path), listings)
+
+        planned_deletions: List[PlannedDeletion] = []
+        items_to_remote_from_registry: List[OrderedFile] = []
+        deleted_paths = set()
 
         # Process registered items first
-        for item in all_registered_items:
-            item_path = Path(item.path)
+        for row in registry_index.rows():
+            relative_path = registry_index.get_relative_path(row)
 
-            # 1.1 Check if the file still exists
-            if not item_path.exists():
-                items_to_remote_from_registry.append(item)
-                continue
+            # 1.1 Check if the file still exists (from the listing of its folder when available)
+            relative_parent, name = os.path.split(relative_path)
+            siblings = listings.get(relative_parent or ROOT_DIRECTORY) if not os.path.isabs(relative_path) else None
+            if siblings is not None:
+                item_exists = name in siblings
+            else:
+                item_exists = os.path.exists(registry_index.get_path(row))
 
-            # 1.2 Check lifecycle policy
-            policy = next((rule.lifecycle for rule in self.__sorting_rules
-                           if rule.rule_name == item.rule_name_applied))
+            if not item_exists:
+                items_to_remote_from_registry.append(registry_index.to_ordered_file(row))
 
-            if policy and policy.enabled:
-                days_expired = (datetime.now().date() - item.ordered_date).days
+        # 1.2 Apply the lifecycle policies: only the items due today are read from the expiry index
+        missing_paths = {item.path for item in items_to_remote_from_registry}
+
+        for item in self.__get_expired_items(today, expiry_updates, registry_index):
+            if item.path in missing_paths or item.path in deleted_paths:
+                continue
 
-                if days_expired > policy.days_to_keep:
-                    if policy.action == 'trash':
-                        send2trash(item.path)
-                    elif policy.action == 'delete':
-                        if item_path.is_dir():
-                            shutil.rmtree(item.path) # Remove directory and its contents
-                        else:
-                            os.remove(item.path) # Remove file
+            applied_rule = self.__rule_matcher.get_rule_by_name(item.rule_name_applied)
+            policy = applied_rule.lifecycle if applied_rule else None
 
-                    items_deleted_count += 1
-                    items_to_remote_from_registry.append(item)
+            if not policy or not policy.enabled:
+                continue
 
+            planned_deletions.append(PlannedDeletion(ordered_file=item, action=policy.action))
+            deleted_paths.add(item.path)
 
         # 2. Process unregistered items
         not_registered_items = []
-        full_sorting_rules_paths = [self.__path_repository.get_destination_path() / rule.destination_folder
-                                    for rule in self.__sorting_rules if rule.destination_folder]
+        full_sorting_rules_paths = {str(destination_path / rule.destination_folder)
+                                    for rule in self.__sorting_rules if rule.destination_folder}
 
-        for physical_item_path in destination_path.rglob('*'):
+        for parent_path, (relative_parent, children) in listings_by_path.items():
+            for name, kind in children.items():
+                physical_item_path = os.path.join(parent_path, name)
 
-            item_has_sub_folders = (
-                    physical_item_path.is_dir() and
-                    any(child.is_dir() for child in physical_item_path.iterdir())
-            )
-            if item_has_sub_folders:
-                continue
+                if physical_item_path in deleted_paths:
+                    continue
 
-            # determine if the item is already registered in a policy destination folder
-            exist_item_in_sorting_rule = physical_item_path in full_sorting_rules_paths
-            if exist_item_in_sorting_rule:
-                continue
+                if kind == ENTRY_DIRECTORY:
+                    child_listing = listings.get(
+                        name if relative_parent == ROOT_DIRECTORY else os.path.join(relative_parent, name), {})
+                    item_has_sub_folders = any(child_kind != ENTRY_FILE for child_kind in child_listing.values())
+                    if item_has_sub_folders:
+                        continue
+
+                # determine if the item is already registered in a policy destination folder
+                exist_item_in_sorting_rule = physical_item_path in full_sorting_rules_paths
+                if exist_item_in_sorting_rule:
+                    continue
 
+                relative_item_path = name if relative_parent == ROOT_DIRECTORY else os.path.join(relative_parent, name)
+                if registry_index.find_relative_path(relative_item_path) is None:
+                    # 2.1 Determine rule name applied: the relative parent folder to destination path
+                    rule_name = relative_parent
 
-            if str(physical_item_path) not in registered_paths_map:
-                # 2.1 Determine rule name applied and  Get the relative parent folder to destination path
-                relative_parent = physical_item_path.parent.relative_to(destination_path)
+                    # 2.2 find the rule applied
+                    matching_rule = self.__rule_matcher.get_rule_by_destination(rule_name)
 
-                rule_name = str(relative_parent)
+                    if matching_rule is None or matching_rule.lifecycle is None or not matching_rule.lifecycle.enabled:
+                        continue
 
-                # 2.2 find the rule applied
-                matching_rule = next((rule for rule in self.__sorting_rules
-                                      if rule.destination_folder == rule_name), None)
+                    new_item = OrderedFile(
+                        name=name,
+                        ordered_date=today,
+                        path=physical_item_path,
+                        rule_name_applied=matching_rule.rule_name,
+                        expiry_date=matching_rule.lifecycle.get_expiry_date(today)
+                    )
 
-                if matching_rule is None or matching_rule.lifecycle is None or not matching_rule.lifecycle.enabled:
-                    continue
+                    not_registered_items.append(new_item)
+
+        return AuditPlan(
+            deletions=tuple(planned_deletions),
+            registrations=tuple(not_registered_items),
+            unregistrations=tuple(items_to_remote_from_registry),
+            expiry_updates=tuple(expiry_updates or ()),
+            lifecycle_signature=lifecycle_signature,
+        )
+
+    def execute_plan(self, audit_plan: AuditPlan) -> None:
+        """
+        Apply an audit plan: run the expired lifecycle actions, then update the registry in a single write.
 
-                new_item = OrderedFile(
-                    name=physical_item_path.name,
-                    ordered_date=datetime.now().date(),
-                    path=str(physical_item_path),
-                    rule_name_applied=rule_name
-                )
+        :param audit_plan: A plan from plan(), possibly computed by an earlier process.
+        """
+        items_deleted_count = 0
+        items_to_remote_from_registry: List[OrderedFile] = list(audit_plan.unregistrations)
+
+        # 1. Soft deleted items whose window is over are purged in bulk
+        self.__deletion_executor.purge(datetime.now().date())
+
+        # 2. Lifecycle actions, run as a single batch
+        pending_deletions = []
+        for planned_deletion in audit_plan.deletions:
+            # The item may be gone since the plan was computed
+            if os.path.lexists(planned_deletion.ordered_file.path):
+                pending_deletions.append(planned_deletion)
+            else:
+                items_to_remote_from_registry.append(planned_deletion.ordered_file)
+
+        with self.__metrics_recorder.timer("operation_seconds", operation="lifecycle_batch"):
+            deletion_errors = self.__deletion_executor.execute(pending_deletions)
+
+        for planned_deletion, error in zip(pending_deletions, deletion_errors):
+            item = planned_deletion.ordered_file
+
+            # A failed item stays registered, its action is tried again on the next run
+            if error is not None:
+                print(f"Error applying the lifecycle action of {item.path}: {error}")
+                self.__metrics_recorder.increment("lifecycle_failures", action=planned_deletion.action)
+                continue
+
+            items_to_remote_from_registry.append(item)
+            items_deleted_count += 1
+            self.__metrics_recorder.increment("items_expired", action=planned_deletion.action)
+
+        # 3. Register unregistered items and remove deleted items in a single write
+        with self.__metrics_recorder.timer("operation_seconds", operation="registry_update"), \
+                self.__ordered_files_repository.transaction():
+            # 3.1 Expiry dates computed with the current lifecycle policies
+            if audit_plan.expiry_updates:
+                self.__ordered_files_repository.upsert_many(list(audit_plan.expiry_updates))
 
-                not_registered_items.append(new_item)
+            if audit_plan.registrations:
+                self.__ordered_files_repository.save_ordered_files(list(audit_plan.registrations))
 
-        # 3. Register unregistered items
-        if not_registered_items:
-            self.__ordered_files_repository.save_ordered_files(not_registered_items)
+            # 3.2 Remove deleted items from registry
+            if items_to_remote_from_registry:
+                self.__ordered_files_repository.delete_many([item.path for item in items_to_remote_from_registry])
 
-        # 3.1 Remove deleted items from registry
-        if items_to_remote_from_registry:
-            for item in items_to_remote_from_registry:
-                self.__ordered_files_repository.delete(item.name)
+        self.__metrics_recorder.increment("items_registered", len(audit_plan.registrations))
+        self.__metrics_recorder.increment("items_unregistered", len(items_to_remote_from_registry))
+
+        if audit_plan.lifecycle_signature:
+            self.__state_store.save(self.__zone_name, self.LIFECYCLE_SIGNATURE_KEY, audit_plan.lifecycle_signature)
 
         # 4. Send notification
         if items_deleted_count > 0:
-            self.__notification_service.send_notification(f"{items_deleted_count} items have been deleted")
\ No newline at end of file
+            self.__notification_service.send_notification(f"{items_deleted_count} items have been deleted")
+
+    def __plan_expiry_updates(self, registry_index: RegistryIndex) -> Tuple[Optional[str], Optional[List[OrderedFile]]]:
+        """
+        Registered items carry the date on which they expire, so only the due ones are read on each run.
+        When the lifecycle settings differ from the ones those dates were computed with (or for items
+        registered before expiry dates existed) every date is computed again, once.
+
+        :return: The new lifecycle signature and the items whose expiry date changed,
+                 or (None, None) when the stored dates are up to date.
+        """
+        lifecycle_signature = self.__get_lifecycle_signature()
+
+        if self.__state_store.load(self.__zone_name, self.LIFECYCLE_SIGNATURE_KEY) == lifecycle_signature:
+            return None, None
+
+        updated_items = []
+        for row in registry_index.rows():
+            rule_name = registry_index.get_rule_name(row)
+            # Items found in a destination folder used to be registered under the folder's name
+            applied_rule = self.__rule_matcher.get_rule_by_name(rule_name) \
+                or self.__rule_matcher.get_rule_by_destination(rule_name)
+            expiry_date = applied_rule.lifecycle.get_expiry_date(date.fromordinal(registry_index.get_ordered_ordinal(row))) \
+                if applied_rule and applied_rule.lifecycle else None
+
+            expiry_ordinal = expiry_date.toordinal() if expiry_date else NO_EXPIRY
+            applied_rule_name = applied_rule.rule_name if applied_rule else rule_name
+            if registry_index.get_expiry_ordinal(row) != expiry_ordinal or applied_rule_name != rule_name:
+                updated_items.append(registry_index.to_ordered_file(row).model_copy(
+                    update={"expiry_date": expiry_date, "rule_name_applied": applied_rule_name}))
+
+        return lifecycle_signature, updated_items
+
+    def __get_expired_items(self, today: date, expiry_updates: Optional[List[OrderedFile]],
+                            registry_index: RegistryIndex) -> List[OrderedFile]:
+        if not expiry_updates:
+            return self.__ordered_files_repository.get_expired_files(today)
+
+        # The stored expiry dates are outdated: use the ones the plan will store
+        updated_items_by_path = {item.path: item for item in expiry_updates}
+        expired_items = []
+        for row in registry_index.rows():
+            item = updated_items_by_path.get(registry_index.get_path(row))
+            if item is None:
+                expiry_ordinal = registry_index.get_expiry_ordinal(row)
+                if expiry_ordinal != NO_EXPIRY and expiry_ordinal <= today.toordinal():
+                    expired_items.append(registry_index.to_ordered_file(row))
+            elif item.expiry_date and item.expiry_date <= today:
+                expired_items.append(item)
+
+        return sorted(expired_items, key=lambda item: item.expiry_date)
+
+    def __get_lifecycle_signature(self) -> str:
+        lifecycle_settings = [
+            [rule.rule_name, rule.lifecycle.enabled, rule.lifecycle.days_to_keep] if rule.lifecycle else [rule.rule_name]
+            for rule in self.__sorting_rules
+        ]
+        return hashlib.sha256(json.dumps([self.LIFECYCLE_SIGNATURE_VERSION, lifecycle_settings])
+                              .encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def __index_listings_by_path(destination_path: str, listings: Dict[str, Dict[str, int]]):
+        """ Key every listing by the absolute folder path, as stored in the registry. """
+        return {
+            destination_path if relative_path == ROOT_DIRECTORY else os.path.join(destination_path, relative_path):
+                (relative_path, children)
+            for relative_path, children in listings.items()
+        }
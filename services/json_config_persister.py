@@ -1,11 +1,111 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from pydantic import TypeAdapter
+
+from helpers.config_loader import ConfigLoader
 from models.app_config import ZoneConfig, RootConfig
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+
+# Serializes the dumped document as model_dump_json would (json.dumps with an indent is pure Python)
+_document_adapter = TypeAdapter(dict)
 
 
 class JsonConfigPersister:
-    def __init__(self, json_path, root_config: RootConfig):
+    def __init__(self, json_path, root_config: RootConfig, metrics_recorder: Optional[MetricsRecorder] = None,
+                 config_loader: Optional[ConfigLoader] = None):
+        """
+        :param config_loader: The loader of root_config, when it was loaded zone by zone: the registries
+                              it did not load are written back as they were, and its cache is kept valid.
+        """
         self.json_file_path = json_path
         self.root_config = root_config
+        self.__metrics_recorder = metrics_recorder or NullMetricsRecorder()
+        self.__config_loader = config_loader
+
+        self.__deferred_depth = 0
+        self.__is_dirty = False
+
+        # Zone name -> serialized registry, for the registries kept outside root_config (see set_registry_source)
+        self.__registry_sources: Dict[str, Callable[[], List[dict]]] = {}
+
+        # Zones may run in parallel: registry mutations and writes are serialized on this lock
+        self.lock = threading.RLock()
 
     def save(self):
-        with open(self.json_file_path, 'w', encoding='utf-8') as json_file:
-            json_file.write(self.root_config.model_dump_json(indent=4, by_alias=True))
+        """
+        Persist the configuration. Inside a deferred() block the write is postponed
+        until the outermost block exits, so a whole run costs at most one write.
+        """
+        with self.lock:
+            if self.__deferred_depth > 0:
+                self.__is_dirty = True
+                return
+
+            self.__write()
+
+    def set_registry_source(self, zone_name: str, registry_source: Callable[[], List[dict]]) -> None:
+        """
+        Write the 'orderedFiles' of a zone from the given callable (called under the lock) instead of
+        from its ZoneConfig, for repositories that keep the registry in a compact form.
+        """
+        with self.lock:
+            self.__registry_sources[zone_name] = registry_source
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        with self.lock:
+            self.__deferred_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.__deferred_depth -= 1
+                if self.__deferred_depth == 0 and self.__is_dirty:
+                    self.__write()
+
+    def __write(self):
+        """ Write to a temporary file in the same folder and rename it over the original. """
+        self.__is_dirty = False
+        self.__metrics_recorder.increment("json_writes", target="settings")
+
+        with self.__metrics_recorder.timer("operation_seconds", operation="settings_write"):
+            self.__write_file()
+
+    def __write_file(self):
+        document = self.root_config.model_dump(mode='json', by_alias=True)
+        for zone in document["zones"]:
+            registry_source = self.__registry_sources.get(zone["zoneName"])
+            if registry_source:
+                zone["orderedFiles"] = registry_source()
+
+        if self.__config_loader:
+            self.__config_loader.restore_unloaded_registries(document)
+
+        json_data = _document_adapter.dump_json(document, indent=4).decode('utf-8')
+
+        directory = os.path.dirname(os.path.abspath(self.json_file_path))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".settings.", suffix=".tmp")
+
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as json_file:
+                json_file.write(json_data)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+
+            # Keep the permissions of the file being replaced (mkstemp creates it as 0600)
+            if os.path.exists(self.json_file_path):
+                os.chmod(temp_path, os.stat(self.json_file_path).st_mode & 0o777)
+
+            os.replace(temp_path, self.json_file_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Only the registries changed: the cached configuration stays valid for the new file
+        if self.__config_loader:
+            self.__config_loader.refresh_cache({zone["zoneName"] for zone in document["zones"] if zone["orderedFiles"]})
@@ -0,0 +1,232 @@
+import contextlib
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the duration histogram buckets, from fast file operations to slow runs
+DURATION_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0, 600.0)
+
+# Prefix of every metric in the Prometheus export
+METRIC_PREFIX = "nexus_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRecorder(ABC):
+    """
+    Counters and durations recorded during a run.
+
+    Durations are histograms: 'phase_seconds' for the stages of a run, 'operation_seconds' for
+    single operations (moves, registry writes...), so slow ones stand out in the upper buckets.
+    """
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        pass
+
+    @abstractmethod
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        pass
+
+    def timer(self, name: str, **labels: str) -> ContextManager[None]:
+        """ Observe how long the block takes, even if it raises. """
+        return self.__timer(name, labels)
+
+    def labeled(self, **labels: str) -> "MetricsRecorder":
+        """ A view of this recorder adding the labels to everything recorded through it (e.g. the zone). """
+        return LabeledMetricsRecorder(self, labels)
+
+    def export(self) -> None:
+        """ Write the metrics recorded so far to the configured outputs. """
+        pass
+
+    @contextlib.contextmanager
+    def __timer(self, name: str, labels: Dict[str, str]) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+
+class NullMetricsRecorder(MetricsRecorder):
+    """ Metrics disabled: every call returns at once. """
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        pass
+
+    def timer(self, name: str, **labels: str) -> ContextManager[None]:
+        return contextlib.nullcontext()
+
+    def labeled(self, **labels: str) -> MetricsRecorder:
+        return self
+
+
+class LabeledMetricsRecorder(MetricsRecorder):
+    def __init__(self, recorder: MetricsRecorder, labels: Dict[str, str]):
+        self.__recorder = recorder
+        self.__labels = labels
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        self.__recorder.increment(name, value, **self.__labels, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        self.__recorder.observe(name, seconds, **self.__labels, **labels)
+
+    def labeled(self, **labels: str) -> MetricsRecorder:
+        return LabeledMetricsRecorder(self.__recorder, {**self.__labels, **labels})
+
+    def export(self) -> None:
+        self.__recorder.export()
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        # Observations per bucket (not cumulative), the last one is +Inf
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS) + 1)
+
+
+class InMemoryMetricsRecorder(MetricsRecorder):
+    """
+    Keeps the metrics of the process in memory and exports them as JSON lines (appended, one line
+    per series and export) and/or as a Prometheus text file (replaced atomically, for the node
+    exporter's textfile collector). Counters and histograms are cumulative since the process started.
+    """
+
+    def __init__(self, json_lines_path: Optional[Path] = None, prometheus_path: Optional[Path] = None):
+        self.__json_lines_path = json_lines_path
+        self.__prometheus_path = prometheus_path
+
+        self.__counters: Dict[Tuple[str, Labels], float] = {}
+        self.__histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+        # Zones and moves record from several threads
+        self.__lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = _Histogram()
+
+            histogram.count += 1
+            histogram.sum += seconds
+            histogram.max = max(histogram.max, seconds)
+            histogram.bucket_counts[self.__get_bucket_index(seconds)] += 1
+
+    def export(self) -> None:
+        try:
+            if self.__json_lines_path:
+                self.__export_json_lines(self.__json_lines_path)
+            if self.__prometheus_path:
+                self.__export_prometheus(self.__prometheus_path)
+        except OSError as e:
+            print(f"Error exporting metrics: {e}")
+
+    def __export_json_lines(self, path: Path) -> None:
+        timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+        lines = []
+
+        with self.__lock:
+            for (name, labels), value in sorted(self.__counters.items()):
+                lines.append({"timestamp": timestamp, "metric": name, "type": "counter",
+                              "labels": dict(labels), "value": value})
+
+            for (name, labels), histogram in sorted(self.__histograms.items(), key=lambda item: item[0]):
+                lines.append({"timestamp": timestamp, "metric": name, "type": "histogram",
+                              "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                              "max": histogram.max,
+                              "buckets": dict(zip(self.__get_bucket_names(),
+                                                  self.__get_cumulative_counts(histogram)))})
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as json_lines_file:
+            for line in lines:
+                json_lines_file.write(json.dumps(line) + "\n")
+
+    def __export_prometheus(self, path: Path) -> None:
+        output_lines: List[str] = []
+
+        with self.__lock:
+            counter_names = sorted({name for name, _ in self.__counters})
+            for name in counter_names:
+                metric_name = f"{METRIC_PREFIX}{name}_total"
+                output_lines.append(f"# TYPE {metric_name} counter")
+                for (series_name, labels), value in sorted(self.__counters.items()):
+                    if series_name == name:
+                        output_lines.append(f"{metric_name}{self.__format_labels(labels)} {value!r}")
+
+            histogram_names = sorted({name for name, _ in self.__histograms})
+            for name in histogram_names:
+                metric_name = f"{METRIC_PREFIX}{name}"
+                output_lines.append(f"# TYPE {metric_name} histogram")
+                for (series_name, labels), histogram in sorted(self.__histograms.items(), key=lambda item: item[0]):
+                    if series_name != name:
+                        continue
+
+                    for bucket_name, count in zip(self.__get_bucket_names(), self.__get_cumulative_counts(histogram)):
+                        output_lines.append(
+                            f"{metric_name}_bucket{self.__format_labels(labels + (('le', bucket_name),))} {count}")
+                    output_lines.append(f"{metric_name}_sum{self.__format_labels(labels)} {histogram.sum:.6f}")
+                    output_lines.append(f"{metric_name}_count{self.__format_labels(labels)} {histogram.count}")
+
+        # Written to a temporary file and renamed, so a scrape never reads a half-written file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".metrics.", suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as prometheus_file:
+                prometheus_file.write("\n".join(output_lines) + "\n")
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def __get_bucket_index(seconds: float) -> int:
+        for index, upper_bound in enumerate(DURATION_BUCKETS):
+            if seconds <= upper_bound:
+                return index
+        return len(DURATION_BUCKETS)
+
+    @staticmethod
+    def __get_bucket_names() -> List[str]:
+        return [f"{upper_bound:g}" for upper_bound in DURATION_BUCKETS] + ["+Inf"]
+
+    @staticmethod
+    def __get_cumulative_counts(histogram: _Histogram) -> List[int]:
+        cumulative_counts = []
+        total = 0
+        for count in histogram.bucket_counts:
+            total += count
+            cumulative_counts.append(total)
+        return cumulative_counts
+
+    @staticmethod
+    def __format_labels(labels: Labels) -> str:
+        if not labels:
+            return ""
+
+        def escape(value: str) -> str:
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
@@ -1,4 +1,8 @@
+import re
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
 
 from plyer import notification
 
@@ -8,6 +12,10 @@ class NotificationService(ABC):
     def send_notification(self, message: str):
         pass
 
+    def close(self):
+        """ Deliver anything still pending. Services that send immediately have nothing to do. """
+        pass
+
 
 class PlyerNotificationService(NotificationService):
     def send_notification(self, message: str):
@@ -17,3 +25,120 @@ class PlyerNotificationService(NotificationService):
             app_icon="assets/work.ico",
             timeout=8
         )
+
+
+class LoggingNotificationService(NotificationService):
+    """ For headless servers: notifications are printed instead of shown. """
+
+    def send_notification(self, message: str):
+        print(f"Notification: {message}")
+
+
+class NullNotificationService(NotificationService):
+    def send_notification(self, message: str):
+        pass
+
+
+class QueuedNotificationService(NotificationService):
+    """
+    Non-blocking notifications: messages are queued and delivered by a background thread,
+    so a slow backend (D-Bus) never holds up the pipeline.
+
+    Messages of every zone received within `batch_seconds` are merged into one summary, and two
+    summaries are at least `min_interval_seconds` apart, so a burst (watch mode) cannot flood the
+    desktop. Whatever is still pending is delivered by close(), at the end of the run.
+    """
+
+    # "5 files were sorted" and "3 files were sorted" become "8 files were sorted"
+    COUNTED_MESSAGE_PATTERN = re.compile(r'^(\d+) (.+)$')
+
+    def __init__(self, backend: NotificationService, batch_seconds: float = 5.0,
+                 min_interval_seconds: float = 30.0):
+        self.__backend = backend
+        self.__batch_seconds = batch_seconds
+        self.__min_interval_seconds = min_interval_seconds
+
+        self.__pending_messages: List[str] = []
+        self.__first_pending_time: Optional[float] = None
+        self.__last_delivery_time = float('-inf')
+        self.__flush_requested = False
+        self.__delivering = False
+        self.__closed = False
+
+        self.__condition = threading.Condition()
+        self.__delivery_thread = threading.Thread(target=self.__deliver_loop, name="notifications", daemon=True)
+        self.__delivery_thread.start()
+
+    def send_notification(self, message: str):
+        with self.__condition:
+            if self.__first_pending_time is None:
+                self.__first_pending_time = time.monotonic()
+            self.__pending_messages.append(message)
+            self.__condition.notify_all()
+
+    def flush(self):
+        """ Deliver the pending messages now, without waiting for the batch window or the rate limit. """
+        with self.__condition:
+            self.__flush_requested = True
+            self.__condition.notify_all()
+            self.__condition.wait_for(lambda: not self.__pending_messages and not self.__delivering)
+            self.__flush_requested = False
+
+    def close(self):
+        self.flush()
+
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__delivery_thread.join()
+
+        self.__backend.close()
+
+    def __deliver_loop(self):
+        while True:
+            with self.__condition:
+                # 1. Wait until a batch is due
+                while True:
+                    if not self.__pending_messages:
+                        if self.__closed:
+                            return
+                        self.__condition.wait()
+                        continue
+
+                    due_time = max(self.__first_pending_time + self.__batch_seconds,
+                                   self.__last_delivery_time + self.__min_interval_seconds)
+                    remaining_seconds = due_time - time.monotonic()
+                    if self.__flush_requested or remaining_seconds <= 0:
+                        break
+                    self.__condition.wait(remaining_seconds)
+
+                messages = self.__pending_messages
+                self.__pending_messages = []
+                self.__first_pending_time = None
+                self.__last_delivery_time = time.monotonic()
+                self.__delivering = True
+
+            # 2. Deliver outside the lock, so senders never wait for the backend
+            try:
+                self.__backend.send_notification(self.__summarize(messages))
+            except Exception as e:
+                print(f"Error sending notification: {e}")
+            finally:
+                with self.__condition:
+                    self.__delivering = False
+                    self.__condition.notify_all()
+
+    @classmethod
+    def __summarize(cls, messages: List[str]) -> str:
+        # Message text -> total count (None for messages without a count), in order of arrival
+        summary: Dict[str, Optional[int]] = {}
+
+        for message in messages:
+            counted_message = cls.COUNTED_MESSAGE_PATTERN.match(message)
+            if counted_message:
+                text = counted_message.group(2)
+                summary[text] = (summary.get(text) or 0) + int(counted_message.group(1))
+            else:
+                summary.setdefault(message, None)
+
+        return "\n".join(text if count is None else f"{count} {text}" for text, count in summary.items())
@@ -1,11 +1,13 @@
-import datetime
 from abc import ABC, abstractmethod
-from datetime import datetime
+from contextlib import AbstractContextManager
+from datetime import date, datetime
 from typing import List, Optional
 
+from helpers.registry_index import NO_EXPIRY, RegistryIndex
 from models.app_config import ZoneConfig
 from models.models import OrderedFile
 from services.json_config_persister import JsonConfigPersister
+from services.sqlite_database import SqliteDatabase
 
 
 class OrderedFilesRepository(ABC):
@@ -14,7 +16,13 @@ class OrderedFilesRepository(ABC):
         pass
 
     @abstractmethod
-    def get_files_to_delete(self, days_to_keep: int) -> List[OrderedFile]:
+    def get_registry_index(self) -> RegistryIndex:
+        """ Every registered item in a compact, indexed form, for whole-registry scans (audits). """
+        pass
+
+    @abstractmethod
+    def get_expired_files(self, today: date) -> List[OrderedFile]:
+        """ Items whose expiry date is due, read from an expiry-ordered index. """
         pass
 
     @abstractmethod
@@ -22,47 +30,189 @@ class OrderedFilesRepository(ABC):
         pass
 
     @abstractmethod
-    def find(self, file_name: str) -> Optional[OrderedFile]:
+    def find(self, file_path: str) -> Optional[OrderedFile]:
+        """ The item registered at this full path (names repeat across folders and zones, paths do not). """
         pass
 
     @abstractmethod
-    def delete(self, file_name: str) -> None:
+    def delete(self, file_path: str) -> None:
+        pass
+
+    @abstractmethod
+    def delete_many(self, file_paths: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def upsert_many(self, ordered_files: List[OrderedFile]) -> None:
+        """ Insert the given items, replacing any registered item with the same path. """
+        pass
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager:
+        """ Group every mutation made inside the block into a single write. """
         pass
 
 class ConfigOrderedFilesRepository(OrderedFilesRepository):
+    """
+    Registry of a zone kept in settings.json ('json' backend).
+
+    The validated items are moved into a compact RegistryIndex, and the persister serializes the index
+    straight to JSON when settings.json is written, so no OrderedFile model is kept per registered item.
+    """
+
     def __init__(self, zone_config: ZoneConfig, persister: JsonConfigPersister):
-        self.__zone_config = zone_config
         self.__persister = persister
 
-        self.__ordered_files = zone_config.ordered_files
+        with self.__persister.lock:
+            self.__registry_index = RegistryIndex.from_ordered_files(str(zone_config.paths.destination_path),
+                                                                     zone_config.ordered_files)
+            zone_config.ordered_files = []
+            self.__persister.set_registry_source(zone_config.zone_name, self.__dump_registry)
 
     def get_ordered_files(self) -> List[OrderedFile]:
-        return self.__ordered_files
+        with self.__persister.lock:
+            return [self.__registry_index.to_ordered_file(row) for row in self.__registry_index.rows()]
+
+    def get_registry_index(self) -> RegistryIndex:
+        return self.__registry_index
 
     def save_ordered_files(self, new_ordered_files: List[OrderedFile]) -> None:
-        self.__ordered_files.extend(new_ordered_files)
-        self.__zone_config.ordered_files = self.__ordered_files
-        self.__persister.save()
-
-    def find(self, file_name: str) -> OrderedFile | None:
-        for ordered_file in self.__ordered_files:
-            if ordered_file.name == file_name:
-                return ordered_file
-        return None
-
-    def delete(self, file_name: str) -> None:
-        file_to_remove = self.find(file_name)
-        if file_to_remove:
-            self.__ordered_files.remove(file_to_remove)
-            self.__zone_config.ordered_files = self.__ordered_files
+        with self.__persister.lock:
+            for item in new_ordered_files:
+                self.__registry_index.add_ordered_file(item)
+            self.__persister.save()
+
+    def find(self, file_path: str) -> OrderedFile | None:
+        row = self.__registry_index.find_path(file_path)
+        return self.__registry_index.to_ordered_file(row) if row is not None else None
+
+    def delete(self, file_path: str) -> None:
+        self.delete_many([file_path])
+
+    def delete_many(self, file_paths: List[str]) -> None:
+        with self.__persister.lock:
+            removed_count = 0
+            for file_path in file_paths:
+                row = self.__registry_index.find_path(file_path)
+                if row is not None:
+                    self.__registry_index.remove(row)
+                    removed_count += 1
+
+            if removed_count:
+                self.__registry_index.compact()
+                self.__persister.save()
+
+    def upsert_many(self, ordered_files: List[OrderedFile]) -> None:
+        with self.__persister.lock:
+            # Adding an item replaces the one registered at the same path
+            for item in ordered_files:
+                self.__registry_index.add_ordered_file(item)
+            self.__registry_index.compact()
             self.__persister.save()
 
-    def get_files_to_delete(self, days_to_keep: int) -> List[OrderedFile]:
-        files_to_delete = []
-        current_date = datetime.now().date()
+    def transaction(self) -> AbstractContextManager:
+        return self.__persister.deferred()
+
+    def get_expired_files(self, today: date) -> List[OrderedFile]:
+        with self.__persister.lock:
+            return [self.__registry_index.to_ordered_file(row)
+                    for row in self.__registry_index.get_expired_rows(today.toordinal())]
+
+    def __dump_registry(self) -> List[dict]:
+        """ The registry as settings.json stores it, called by the persister (under its lock). """
+        return [self.__registry_index.to_json(row) for row in self.__registry_index.rows()]
+
 
-        for ordered_file in self.__ordered_files:
-            if (current_date - ordered_file.ordered_date).days > days_to_keep:
-                files_to_delete.append(ordered_file)
+class SqliteOrderedFilesRepository(OrderedFilesRepository):
+    """
+    Registry of a single zone stored in the shared SQLite database.
+    Every lookup goes through an index, and writes never touch settings.json.
+    """
 
-        return files_to_delete
+    COLUMNS = "name, ordered_date, path, rule_name_applied, expiry_date"
+
+    # Ordinal of a date (as date.toordinal() computes it) from its Julian day number
+    ORDINAL_FROM_JULIAN_DAY = 1721424.5
+
+    def __init__(self, zone_name: str, database: SqliteDatabase, destination_path: str):
+        self.__zone_name = zone_name
+        self.__database = database
+        self.__destination_path = destination_path
+
+    def get_ordered_files(self) -> List[OrderedFile]:
+        rows = self.__database.query(
+            f"SELECT {self.COLUMNS} FROM ordered_files WHERE zone = ? ORDER BY id",
+            (self.__zone_name,)
+        )
+        return [self.__to_ordered_file(row) for row in rows]
+
+    def get_registry_index(self) -> RegistryIndex:
+        # Dates are converted to ordinals by SQLite, so rows go into the index without any model
+        rows = self.__database.query(
+            f"SELECT name, path, rule_name_applied, "
+            f"CAST(julianday(ordered_date) - {self.ORDINAL_FROM_JULIAN_DAY} AS INTEGER), "
+            f"COALESCE(CAST(julianday(expiry_date) - {self.ORDINAL_FROM_JULIAN_DAY} AS INTEGER), {NO_EXPIRY}) "
+            f"FROM ordered_files WHERE zone = ? ORDER BY id",
+            (self.__zone_name,)
+        )
+
+        registry_index = RegistryIndex(self.__destination_path)
+        for name, path, rule_name_applied, ordered_ordinal, expiry_ordinal in rows:
+            registry_index.add(name, path, rule_name_applied, ordered_ordinal, expiry_ordinal, replace=False)
+        return registry_index
+
+    def save_ordered_files(self, new_ordered_files: List[OrderedFile]) -> None:
+        with self.__database.transaction() as connection:
+            # An item replaces the one registered at the same path, as in the registry index
+            connection.executemany(
+                "DELETE FROM ordered_files WHERE zone = ? AND path = ?",
+                [(self.__zone_name, item.path) for item in new_ordered_files]
+            )
+            connection.executemany(
+                "INSERT INTO ordered_files (zone, name, ordered_date, path, rule_name_applied, expiry_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.__zone_name, item.name, item.ordered_date.isoformat(), item.path, item.rule_name_applied,
+                  item.expiry_date.isoformat() if item.expiry_date else None)
+                 for item in new_ordered_files]
+            )
+
+    def find(self, file_path: str) -> OrderedFile | None:
+        rows = self.__database.query(
+            f"SELECT {self.COLUMNS} FROM ordered_files WHERE zone = ? AND path = ?",
+            (self.__zone_name, file_path)
+        )
+        return self.__to_ordered_file(rows[0]) if rows else None
+
+    def delete(self, file_path: str) -> None:
+        self.delete_many([file_path])
+
+    def delete_many(self, file_paths: List[str]) -> None:
+        with self.__database.transaction() as connection:
+            connection.executemany(
+                "DELETE FROM ordered_files WHERE zone = ? AND path = ?",
+                [(self.__zone_name, file_path) for file_path in file_paths]
+            )
+
+    def upsert_many(self, ordered_files: List[OrderedFile]) -> None:
+        self.save_ordered_files(ordered_files)
+
+    def transaction(self) -> AbstractContextManager:
+        return self.__database.transaction()
+
+    def get_expired_files(self, today: date) -> List[OrderedFile]:
+        rows = self.__database.query(
+            f"SELECT {self.COLUMNS} FROM ordered_files WHERE zone = ? AND expiry_date <= ? ORDER BY expiry_date",
+            (self.__zone_name, today.isoformat())
+        )
+        return [self.__to_ordered_file(row) for row in rows]
+
+    @staticmethod
+    def __to_ordered_file(row) -> OrderedFile:
+        name, ordered_date, path, rule_name_applied, expiry_date = row
+        return OrderedFile(
+            name=name,
+            ordered_date=datetime.strptime(ordered_date, "%Y-%m-%d").date(),
+            path=path,
+            rule_name_applied=rule_name_applied,
+            expiry_date=datetime.strptime(expiry_date, "%Y-%m-%d").date() if expiry_date else None,
+        )
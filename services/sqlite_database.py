@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Sequence
+
+
+class SqliteDatabase:
+    """
+    Embedded SQLite store for the ordered files registry of every zone.
+    The database runs in WAL mode so reads never block the single writer.
+
+    A single connection is shared by every zone; when zones run in parallel, access
+    is serialized on an internal lock held for the whole duration of a transaction.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ordered_files (
+            id INTEGER PRIMARY KEY,
+            zone TEXT NOT NULL,
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            rule_name_applied TEXT NOT NULL,
+            ordered_date TEXT NOT NULL,
+            expiry_date TEXT,
+            -- A path is registered once per zone: saving an item replaces the row at its path
+            UNIQUE (zone, path)
+        );
+    """
+
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_ordered_files_name ON ordered_files (zone, name);
+        CREATE INDEX IF NOT EXISTS idx_ordered_files_rule ON ordered_files (zone, rule_name_applied);
+        CREATE INDEX IF NOT EXISTS idx_ordered_files_date ON ordered_files (zone, ordered_date);
+        CREATE INDEX IF NOT EXISTS idx_ordered_files_expiry ON ordered_files (zone, expiry_date);
+    """
+
+    def __init__(self, database_path: Path, in_memory: bool = False):
+        """
+        :param in_memory: Work on an in-memory copy of the database, the file is never written (plans).
+        """
+        self.database_path = database_path
+
+        # Autocommit mode: transactions are opened explicitly in transaction()
+        if in_memory:
+            self.connection = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            if database_path.exists():
+                source_connection = sqlite3.connect(str(database_path))
+                try:
+                    source_connection.backup(self.connection)
+                finally:
+                    source_connection.close()
+        else:
+            self.database_path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(str(database_path), isolation_level=None, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self.connection.executescript(self.INDEXES)
+
+        self.__transaction_depth = 0
+        self.__lock = threading.RLock()
+
+    def query(self, sql: str, parameters: Sequence = ()) -> List[tuple]:
+        with self.__lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Group every statement executed inside the block into a single transaction.
+        Nested blocks (from the same thread) join the outermost transaction.
+        """
+        with self.__lock:
+            if self.__transaction_depth == 0:
+                self.connection.execute("BEGIN")
+
+            self.__transaction_depth += 1
+            try:
+                yield self.connection
+            except Exception:
+                self.__transaction_depth -= 1
+                if self.__transaction_depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.__transaction_depth -= 1
+                if self.__transaction_depth == 0:
+                    self.connection.execute("COMMIT")
+
+    def close(self):
+        self.connection.close()
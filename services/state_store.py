@@ -0,0 +1,68 @@
+import json
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional
+
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+
+
+class StateStore(ABC):
+    """ Persisted working state (caches, snapshots, journals) kept between runs. """
+
+    @abstractmethod
+    def load(self, zone_name: str, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def save(self, zone_name: str, key: str, data: Any) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, zone_name: str, key: str) -> None:
+        pass
+
+
+class JsonStateStore(StateStore):
+    """ One compact JSON file per zone and key, written atomically. """
+
+    def __init__(self, directory: Path, metrics_recorder: Optional[MetricsRecorder] = None):
+        self.__directory = directory
+        self.__metrics_recorder = metrics_recorder or NullMetricsRecorder()
+
+    def load(self, zone_name: str, key: str) -> Optional[Any]:
+        try:
+            with open(self.__file_path(zone_name, key), 'r', encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            # A corrupted state file only costs a full rebuild
+            print(f"Error loading state {key} of zone {zone_name}: {e}")
+            return None
+
+    def save(self, zone_name: str, key: str, data: Any) -> None:
+        self.__metrics_recorder.increment("json_writes", target="state", key=key)
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.__directory, prefix=".state.", suffix=".tmp")
+
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as state_file:
+                json.dump(data, state_file, separators=(',', ':'))
+            os.replace(temp_path, self.__file_path(zone_name, key))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, zone_name: str, key: str) -> None:
+        try:
+            os.remove(self.__file_path(zone_name, key))
+        except FileNotFoundError:
+            pass
+
+    def __file_path(self, zone_name: str, key: str) -> Path:
+        safe_zone_name = re.sub(r'[^\w.-]', '_', zone_name)
+        return self.__directory / f"{safe_zone_name}.{key}.json"
@@ -0,0 +1,145 @@
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from file_sorter import FileSorter
+from helpers.deletion_executor import DeletionExecutor
+from helpers.destination_snapshot import DestinationSnapshot
+from helpers.directory_cache import DirectoryCache
+from helpers.directory_creator import DirectoryCreator
+from helpers.duplicate_finder import DuplicateFinder
+from helpers.file_mover import FileMover
+from helpers.protected_paths import ProtectedPaths
+from helpers.rule_matcher import RuleMatcher
+from helpers.scan_cursor import ScanCursor
+from models.app_config import ZoneConfig
+from models.plan import ZonePlan
+from registry_checker import Auditor
+from services.json_config_persister import JsonConfigPersister
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+from services.notification_service import NotificationService
+from services.ordered_files_repository import (
+    ConfigOrderedFilesRepository,
+    OrderedFilesRepository,
+    SqliteOrderedFilesRepository,
+)
+from services.path_repository import ConfigPathRepository
+from services.settings_repository import ConfigSettingsRepository
+from services.sqlite_database import SqliteDatabase
+from services.state_store import StateStore
+
+
+class ZonePipeline:
+    """
+    Wires the repositories and the three pipeline stages of a single zone.
+    The stages are built once, so long-running modes (watch) can reuse them.
+    """
+
+    def __init__(self, zone_config: ZoneConfig,
+                 persister: JsonConfigPersister,
+                 database: Optional[SqliteDatabase],
+                 notification_service: NotificationService,
+                 state_store: StateStore,
+                 protected_paths: List[Path],
+                 metrics_recorder: Optional[MetricsRecorder] = None,
+                 rule_matcher: Optional[RuleMatcher] = None):
+        """
+        :param protected_paths: Destination paths of every zone, which this zone must never sort away.
+        :param metrics_recorder: Where phase timings and counters are recorded, labeled with the zone name.
+        :param rule_matcher: The zone's compiled rules, when the config loader already has them.
+        """
+        self.zone_config = zone_config
+        self.__metrics_recorder = (metrics_recorder or NullMetricsRecorder()).labeled(zone=zone_config.zone_name)
+
+        path_repository = ConfigPathRepository(zone_config.paths)
+        settings_repository = ConfigSettingsRepository(zone_config)
+
+        if database:
+            self.ordered_files_repository: OrderedFilesRepository = SqliteOrderedFilesRepository(
+                zone_config.zone_name, database, str(zone_config.paths.destination_path))
+        else:
+            self.ordered_files_repository = ConfigOrderedFilesRepository(zone_config, persister)
+
+        rule_matcher = rule_matcher or RuleMatcher(settings_repository.get_sorting_rules())
+
+        destination_snapshot = DestinationSnapshot(zone_config.zone_name, zone_config.paths.destination_path,
+                                                   state_store)
+
+        # Folders known to exist, shared by the directory creator and the file sorter
+        self.directory_cache = DirectoryCache(zone_config.zone_name, state_store,
+                                              zone_config.settings.persist_directory_cache)
+
+        self.directory_creator = DirectoryCreator(path_repository, settings_repository, self.directory_cache)
+        self.auditor = Auditor(path_repository, self.ordered_files_repository, settings_repository,
+                               notification_service, rule_matcher, destination_snapshot, state_store,
+                               DeletionExecutor(zone_config.paths.destination_path,
+                                                zone_config.settings.soft_delete_days),
+                               self.__metrics_recorder)
+        # Items the sorter left in place are remembered until the rules deciding that change
+        rules_hash = ScanCursor.get_rules_hash(settings_repository.get_sorting_rules(),
+                                               zone_config.settings.max_size_in_mb)
+        self.file_sorter = FileSorter(path_repository, settings_repository, self.ordered_files_repository,
+                                      notification_service, rule_matcher, ProtectedPaths(protected_paths),
+                                      FileMover(zone_config.zone_name, state_store, self.__metrics_recorder),
+                                      self.directory_cache,
+                                      DuplicateFinder(zone_config.zone_name, zone_config.paths.destination_path,
+                                                      state_store),
+                                      ScanCursor(zone_config.zone_name, state_store, rules_hash),
+                                      self.__metrics_recorder)
+
+        # Seconds spent in each stage during the last run
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def zone_name(self) -> str:
+        return self.zone_config.zone_name
+
+    @property
+    def source_path(self) -> Path:
+        return self.zone_config.paths.source_path
+
+    @property
+    def destination_path(self) -> Path:
+        return self.zone_config.paths.destination_path
+
+    def run(self):
+        self.timings = {}
+        self.directory_cache.reset()
+
+        # 1. Create the directories if they do not exist
+        self.__timed("directories", self.directory_creator.execute)
+
+        # 2. Check the files
+        self.__timed("audit", self.auditor.check_files)
+
+        # 3. Sort the files
+        self.__timed("sort", self.file_sorter.sort)
+
+        self.directory_cache.save()
+
+    def plan(self) -> ZonePlan:
+        """ What run() would do, computed without touching the source or destination trees. """
+        return ZonePlan(zone_name=self.zone_name, audit=self.auditor.plan(), sort=self.file_sorter.plan())
+
+    def execute_plan(self, zone_plan: ZonePlan):
+        self.timings = {}
+        self.directory_cache.reset()
+
+        # 1. Create the directories if they do not exist
+        self.__timed("directories", self.directory_creator.execute)
+
+        # 2. Apply the audit decisions
+        self.__timed("audit", lambda: self.auditor.execute_plan(zone_plan.audit))
+
+        # 3. Apply the moves
+        self.__timed("sort", lambda: self.file_sorter.execute_plan(zone_plan.sort))
+
+        self.directory_cache.save()
+
+    def __timed(self, stage_name: str, stage):
+        start_time = time.perf_counter()
+        try:
+            stage()
+        finally:
+            self.timings[stage_name] = time.perf_counter() - start_time
+            self.__metrics_recorder.observe("phase_seconds", self.timings[stage_name], phase=stage_name)
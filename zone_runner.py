@@ -0,0 +1,95 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from zone_pipeline import ZonePipeline
+
+
+def _paths_overlap(first_path: Path, second_path: Path) -> bool:
+    return first_path == second_path or first_path in second_path.parents or second_path in first_path.parents
+
+
+def group_overlapping_pipelines(pipelines: List[ZonePipeline]) -> List[List[ZonePipeline]]:
+    """
+    Split the zones into groups that are safe to run concurrently. Two zones whose source or
+    destination paths are the same or nested inside each other end up in the same group
+    (transitively), and a group keeps the declaration order of its zones.
+    """
+    resolved_paths = [
+        [Path(os.path.normcase(path.resolve())) for path in (pipeline.source_path, pipeline.destination_path)]
+        for pipeline in pipelines
+    ]
+
+    # Union-find over zone indexes
+    parents = list(range(len(pipelines)))
+
+    def find_root(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for first_index in range(len(pipelines)):
+        for second_index in range(first_index + 1, len(pipelines)):
+            if any(_paths_overlap(first_path, second_path)
+                   for first_path in resolved_paths[first_index]
+                   for second_path in resolved_paths[second_index]):
+                parents[find_root(second_index)] = find_root(first_index)
+
+    groups: Dict[int, List[ZonePipeline]] = {}
+    for index, pipeline in enumerate(pipelines):
+        groups.setdefault(find_root(index), []).append(pipeline)
+
+    return list(groups.values())
+
+
+class ZoneRunner:
+    """
+    Runs the pipeline of every zone, up to `jobs` zones at a time. Zones with overlapping
+    paths are kept sequential, in declaration order.
+    """
+
+    def __init__(self, pipelines: List[ZonePipeline], jobs: int = 1):
+        self.__pipelines = pipelines
+        self.__jobs = max(1, jobs)
+
+    def run(self, zone_task: Optional[Callable[[ZonePipeline], None]] = None) -> None:
+        """
+        :param zone_task: What to run for each zone, the whole pipeline by default.
+        """
+        start_time = time.perf_counter()
+        zone_task = zone_task or ZonePipeline.run
+
+        if self.__jobs == 1:
+            self.__run_group(self.__pipelines, zone_task)
+        else:
+            groups = group_overlapping_pipelines(self.__pipelines)
+            with ThreadPoolExecutor(max_workers=min(self.__jobs, len(groups)) or 1,
+                                    thread_name_prefix="zone") as executor:
+                # Consume the results so unexpected errors surface here
+                list(executor.map(lambda group: self.__run_group(group, zone_task), groups))
+
+        self.__print_summary(time.perf_counter() - start_time)
+
+    @staticmethod
+    def __run_group(pipelines: List[ZonePipeline], zone_task: Callable[[ZonePipeline], None]) -> None:
+        for pipeline in pipelines:
+            try:
+                zone_task(pipeline)
+            except Exception as e:
+                print(f"Error processing zone {pipeline.zone_name}: {e}")
+
+    def __print_summary(self, elapsed_seconds: float) -> None:
+        print(f"Run summary ({len(self.__pipelines)} zones, {self.__jobs} jobs, {elapsed_seconds:.2f}s)")
+
+        for pipeline in self.__pipelines:
+            stage_timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in pipeline.timings.items())
+            total_seconds = sum(pipeline.timings.values())
+            print(f"  {pipeline.zone_name}: {total_seconds:.2f}s ({stage_timings})")
+
+            move_statistics = pipeline.file_sorter.move_statistics
+            if move_statistics.moved_count or move_statistics.failed_count:
+                print(f"    moves: {move_statistics.moved_count} done, {move_statistics.failed_count} failed, "
+                      f"{move_statistics.wall_seconds:.2f}s elapsed, {move_statistics.busy_seconds:.2f}s busy")
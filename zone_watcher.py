@@ -0,0 +1,139 @@
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from helpers.directory_watcher import DirectoryWatcher, PollingDirectoryWatcher
+from helpers.event_debouncer import EventDebouncer
+from services.json_config_persister import JsonConfigPersister
+from services.metrics_recorder import MetricsRecorder, NullMetricsRecorder
+from zone_pipeline import ZonePipeline
+from zone_runner import ZoneRunner
+
+
+class ZoneWatcher:
+    """
+    Long-running mode: instead of scanning every source path on each run, wait for the
+    watcher to report new items and send only those through the zone's FileSorter.
+    """
+
+    def __init__(self, pipelines: List[ZonePipeline],
+                 directory_watcher: DirectoryWatcher,
+                 persister: JsonConfigPersister,
+                 settle_seconds: float = 0.3,
+                 quiet_seconds: float = 30.0,
+                 audit_interval: float = 3600.0,
+                 jobs: int = 1,
+                 metrics_recorder: Optional[MetricsRecorder] = None):
+        """
+        :param settle_seconds: Delay after the last event of an item whose write is known to be complete.
+        :param quiet_seconds: Delay after the last event of an item that may still be written.
+        :param audit_interval: Seconds between two Auditor passes (lifecycle enforcement).
+        :param jobs: Number of zones processed concurrently during the initial full pass.
+        :param metrics_recorder: Exported after the initial pass and after every audit.
+        """
+        self.__directory_watcher = directory_watcher
+        self.__metrics_recorder = metrics_recorder or NullMetricsRecorder()
+        self.__persister = persister
+        self.__settle_seconds = settle_seconds
+        self.__quiet_seconds = quiet_seconds
+        self.__audit_interval = audit_interval
+
+        # The polling backend reports a growing item on every scan, so an item is settled
+        # once it stayed unchanged for a whole interval
+        if isinstance(directory_watcher, PollingDirectoryWatcher):
+            self.__quiet_seconds = directory_watcher.poll_interval * 1.5
+
+        self.__pipelines_by_source: Dict[Path, List[ZonePipeline]] = defaultdict(list)
+        for pipeline in pipelines:
+            self.__pipelines_by_source[pipeline.source_path].append(pipeline)
+
+        self.__zone_runner = ZoneRunner(pipelines, jobs)
+        self.__debouncer = EventDebouncer()
+
+    def run(self):
+        # 1. Start watching before the initial pass so nothing landing in between is missed
+        for source_path in self.__pipelines_by_source:
+            self.__directory_watcher.add_directory(source_path)
+
+        # 2. Initial full pass
+        self.__run_full_pass()
+        for pipelines in self.__pipelines_by_source.values():
+            self.__defer_unsettled_items(pipelines)
+        self.__metrics_recorder.export()
+        next_audit = time.monotonic() + self.__audit_interval
+
+        # 3. Event loop
+        try:
+            while True:
+                timeout = self.__debouncer.time_until_next()
+                audit_timeout = max(0.0, next_audit - time.monotonic())
+                timeout = audit_timeout if timeout is None else min(timeout, audit_timeout)
+
+                for event in self.__directory_watcher.read_events(timeout):
+                    delay = self.__settle_seconds if event.write_complete else self.__quiet_seconds
+                    self.__debouncer.add((event.directory, event.name), delay)
+
+                ready_items = self.__debouncer.pop_ready()
+                if ready_items:
+                    self.__sort_ready_items(ready_items)
+
+                if time.monotonic() >= next_audit:
+                    self.__run_audit()
+                    self.__metrics_recorder.export()
+                    next_audit = time.monotonic() + self.__audit_interval
+
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.__directory_watcher.close()
+
+    def __run_full_pass(self):
+        with self.__persister.deferred():
+            self.__zone_runner.run()
+
+    def __run_audit(self):
+        with self.__persister.deferred():
+            for pipelines in self.__pipelines_by_source.values():
+                for pipeline in pipelines:
+                    # A failing zone must not stop watch mode
+                    try:
+                        pipeline.directory_creator.execute()
+                        pipeline.auditor.check_files()
+                    except Exception as e:
+                        print(f"Error auditing zone {pipeline.zone_name}: {e}")
+
+    def __sort_ready_items(self, ready_items):
+        items_by_source: Dict[Path, List[Path]] = defaultdict(list)
+        sources_to_rescan = set()
+
+        for source_path, name in ready_items:
+            if name is None:
+                sources_to_rescan.add(source_path)
+            else:
+                items_by_source[source_path].append(source_path / name)
+
+        with self.__persister.deferred():
+            for source_path, pipelines in self.__pipelines_by_source.items():
+                for pipeline in pipelines:
+                    if source_path not in sources_to_rescan and source_path not in items_by_source:
+                        continue
+
+                    # A failing zone (or item) must not stop watch mode
+                    try:
+                        if source_path in sources_to_rescan:
+                            pipeline.file_sorter.sort()
+                        else:
+                            # Items may have been moved away or sorted already since the event
+                            existing_items = [item for item in items_by_source[source_path] if item.exists()]
+                            pipeline.file_sorter.sort_items(existing_items)
+                    except Exception as e:
+                        print(f"Error sorting zone {pipeline.zone_name}: {e}")
+                        continue
+                    self.__defer_unsettled_items([pipeline])
+
+    def __defer_unsettled_items(self, pipelines: List[ZonePipeline]):
+        """ Items holding files still being written were left in place, they are sorted again once those settle. """
+        for pipeline in pipelines:
+            for item_path, settle_delay in pipeline.file_sorter.unsettled_items.items():
+                self.__debouncer.add((pipeline.source_path, item_path.name), settle_delay)